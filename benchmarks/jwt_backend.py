@@ -0,0 +1,97 @@
+import asyncio
+import time
+from typing import Callable, List, Optional
+
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+
+from fastapi_auth.core.jwt import JWTBackend
+
+ROUNDS = 500
+
+
+class MemoryCacheBackend:
+    async def mget(self, key: str, *keys: str) -> List[Optional[str]]:
+        return [None for _ in (key, *keys)]
+
+
+def generate_keys(algorithm: str = "RS256"):
+    if algorithm == "ES256":
+        key = ec.generate_private_key(ec.SECP256R1(), default_backend())
+    elif algorithm == "EdDSA":
+        key = ed25519.Ed25519PrivateKey.generate()
+    else:
+        key = rsa.generate_private_key(65537, 2048, default_backend())
+    private_pem = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    public_pem = key.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo,
+    )
+    return private_pem, public_pem
+
+
+def measure(func: Callable[[], None], rounds: int = ROUNDS) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - start) / rounds * 1_000_000
+
+
+def create_backend(
+    private_key: bytes, public_key: bytes, pem: bool = False, algorithm: str = "RS256"
+) -> JWTBackend:
+    backend = JWTBackend(
+        MemoryCacheBackend(), private_key, public_key, 60, 60 * 10, 0, algorithm
+    )
+    if pem:
+        # emulate passing raw PEM bytes on every call
+        kid = backend._keys.active_kid
+        backend._keys._keys[kid] = (algorithm, private_key, public_key)
+    return backend
+
+
+def bench_keys() -> None:
+    private_key, public_key = generate_keys()
+    loop = asyncio.get_event_loop()
+
+    print(f"{'':<16}{'PEM, us':>12}{'key object, us':>18}{'saving, us':>14}")
+    for name in ("create_tokens", "decode_token"):
+        results = []
+        for pem in (True, False):
+            backend = create_backend(private_key, public_key, pem)
+            if name == "create_tokens":
+                results.append(measure(lambda: backend.create_tokens({"id": 1})))
+            else:
+                token = backend.create_access_token({"id": 1})
+                results.append(
+                    measure(
+                        lambda: loop.run_until_complete(backend.decode_token(token))
+                    )
+                )
+        print(
+            f"{name:<16}{results[0]:>12.1f}{results[1]:>18.1f}"
+            f"{results[0] - results[1]:>14.1f}"
+        )
+
+
+def bench_algorithms() -> None:
+    loop = asyncio.get_event_loop()
+
+    print(f"{'':<16}{'sign, ops/s':>14}{'verify, ops/s':>16}")
+    for algorithm in ("RS256", "ES256", "EdDSA"):
+        backend = create_backend(*generate_keys(algorithm), algorithm=algorithm)
+        token = backend.create_access_token({"id": 1})
+        sign = measure(lambda: backend.create_access_token({"id": 1}))
+        verify = measure(lambda: loop.run_until_complete(backend.decode_token(token)))
+        print(f"{algorithm:<16}{1_000_000 / sign:>14.0f}{1_000_000 / verify:>16.0f}")
+
+
+if __name__ == "__main__":
+    bench_keys()
+    print()
+    bench_algorithms()
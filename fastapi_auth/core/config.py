@@ -2,13 +2,34 @@ from string import ascii_letters, digits, punctuation
 from typing import List
 
 from starlette.config import Config
+from starlette.datastructures import CommaSeparatedStrings
 
-JWT_ALGORITHM = "RS256"
+REVOCATION_CHANNEL = "chan:revocation"
+USERS_CHANNEL = "chan:users"
 
 config = Config()
 DEBUG: bool = config("DEBUG", cast=bool, default=False)
 
+JWT_ALGORITHM: str = config("JWT_ALGORITHM", default="RS256")  # RS256, ES256, EdDSA
+
+# proxy addresses whose X-Forwarded-For is trusted for the client IP
+TRUSTED_PROXIES: CommaSeparatedStrings = config(
+    "TRUSTED_PROXIES", cast=CommaSeparatedStrings, default=""
+)
+# per-slot MGET and no cross-slot transactions
+REDIS_CLUSTER: bool = config("REDIS_CLUSTER", cast=bool, default=False)
+
 LOGIN_RATELIMIT: int = config("LOGIN_RATELIMIT", cast=int, default=30)  # per minute
+RATE_LIMIT_LOCAL_SIZE: int = config(
+    "RATE_LIMIT_LOCAL_SIZE", cast=int, default=10000
+)  # keys tracked per process, 0 - off
+
+TOKEN_CACHE_SIZE: int = config("TOKEN_CACHE_SIZE", cast=int, default=10000)
+
+REVOCATION_MIRROR: bool = config("REVOCATION_MIRROR", cast=bool, default=False)
+REVOCATION_MIRROR_MAX_STALENESS: int = config(
+    "REVOCATION_MIRROR_MAX_STALENESS", cast=int, default=30
+)  # seconds
 
 EMAIL_CONFIRMATION_TIMEOUT: int = config(
     "EMAIL_CONFIRMATION_TIMEOUT", cast=int, default=1800
@@ -19,6 +40,53 @@ PASSWORD_RESET_TIMEOUT: int = config("PASSWORD_RESET_TIMEOUT", cast=int, default
 PASSWORD_RESET_MAX: int = config("PASSWORD_RESET_MAX", cast=int, default=2)
 PASSWORD_RESET_LIFETIME: int = config("PASSWORD_RESET_LIFETIME", cast=int, default=7200)
 
+PASSWORD_HASH_EXECUTOR: str = config(
+    "PASSWORD_HASH_EXECUTOR", default="thread"
+)  # thread or process
+PASSWORD_HASH_WORKERS: int = config(
+    "PASSWORD_HASH_WORKERS", cast=int, default=0
+)  # 0 - executor default
+PASSWORD_HASH_CONCURRENCY: int = config(
+    "PASSWORD_HASH_CONCURRENCY", cast=int, default=0
+)  # 0 - PASSWORD_HASH_WORKERS or cpu count
+PASSWORD_HASH_QUEUE: int = config("PASSWORD_HASH_QUEUE", cast=int, default=100)
+PASSWORD_HASH_RETRY_AFTER: int = config(
+    "PASSWORD_HASH_RETRY_AFTER", cast=int, default=5
+)  # seconds
+
+BCRYPT_ROUNDS: int = config("BCRYPT_ROUNDS", cast=int, default=12)
+# hashes outside [min, max] or in a deprecated scheme are rehashed on login
+BCRYPT_MIN_ROUNDS: int = config("BCRYPT_MIN_ROUNDS", cast=int, default=BCRYPT_ROUNDS)
+BCRYPT_MAX_ROUNDS: int = config("BCRYPT_MAX_ROUNDS", cast=int, default=BCRYPT_ROUNDS)
+
+USER_CACHE_TTL: int = config("USER_CACHE_TTL", cast=int, default=300)  # 0 - off
+USER_LOCAL_CACHE_SIZE: int = config(
+    "USER_LOCAL_CACHE_SIZE", cast=int, default=1000
+)  # 0 - off
+USER_LOCAL_CACHE_TTL: int = config("USER_LOCAL_CACHE_TTL", cast=int, default=30)
+USER_LOCAL_CACHE_MAX_STALENESS: int = config(
+    "USER_LOCAL_CACHE_MAX_STALENESS", cast=int, default=30
+)  # seconds
+
+USER_ID_BLOCK_SIZE: int = config("USER_ID_BLOCK_SIZE", cast=int, default=100)
+IMPORT_BATCH_SIZE: int = config("IMPORT_BATCH_SIZE", cast=int, default=1000)
+
+USERNAME_TRIGRAMS: bool = config(
+    "USERNAME_TRIGRAMS", cast=bool, default=False
+)  # index username trigrams for contains search
+
+SEARCH_ESTIMATE_LIMIT: int = config(
+    "SEARCH_ESTIMATE_LIMIT", cast=int, default=10000
+)  # filtered searches stop counting here with total=estimate
+
+ENSURE_INDEXES: bool = config("ENSURE_INDEXES", cast=bool, default=True)
+MIGRATE_REVOCATION_KEYS: bool = config(
+    "MIGRATE_REVOCATION_KEYS", cast=bool, default=False
+)  # move bans and kicks from the flat key names on startup, once after upgrading
+BACKFILL_SEARCH_FIELDS: bool = config(
+    "BACKFILL_SEARCH_FIELDS", cast=bool, default=True
+)  # fill username_lower/trigrams of older users on startup
+
 # validation
 
 USERNAME_MIN_LENGTH: int = config("USERNAME_MIN_LENGTH", cast=int, default=3)
@@ -1,11 +1,135 @@
-import asyncio
+import time
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Dict, Optional, Tuple
 
 import jwt
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives.asymmetric.ed25519 import (
+    Ed25519PrivateKey,
+    Ed25519PublicKey,
+)
+from cryptography.hazmat.primitives.serialization import (
+    load_pem_private_key,
+    load_pem_public_key,
+)
+from jwt.algorithms import Algorithm, get_default_algorithms
 
-from fastapi_auth.core.config import JWT_ALGORITHM
+from fastapi_auth.core import keys
+from fastapi_auth.core.config import (
+    JWT_ALGORITHM,
+    REVOCATION_MIRROR_MAX_STALENESS,
+    TOKEN_CACHE_SIZE,
+)
+from fastapi_auth.core.revocation import RevocationMirror
 from fastapi_auth.db.backend import RedisBackend
+from fastapi_auth.utils.cache import LRUCache
+from fastapi_auth.utils.strings import hash_string
+
+
+class Ed25519Algorithm(Algorithm):
+    """EdDSA over Ed25519, PyJWT 1.x ships without it."""
+
+    def prepare_key(self, key: Any) -> Any:
+        if isinstance(key, (Ed25519PrivateKey, Ed25519PublicKey)):
+            return key
+        if isinstance(key, str):
+            key = key.encode()
+        if b"PRIVATE" in key:
+            return load_pem_private_key(key, None, default_backend())
+        return load_pem_public_key(key, default_backend())
+
+    def sign(self, msg: bytes, key: Ed25519PrivateKey) -> bytes:
+        return key.sign(msg)
+
+    def verify(self, msg: bytes, key: Ed25519PublicKey, sig: bytes) -> bool:
+        try:
+            key.verify(sig, msg)
+            return True
+        except InvalidSignature:
+            return False
+
+
+ALGORITHMS: Dict[str, Algorithm] = {
+    name: get_default_algorithms()[name] for name in ("RS256", "ES256")
+}
+ALGORITHMS["EdDSA"] = Ed25519Algorithm()
+
+jwt_api = jwt.PyJWT(algorithms=[])
+for name, algorithm in ALGORITHMS.items():
+    jwt_api.register_algorithm(name, algorithm)
+
+
+class KeyRing:
+    """Signing and verification keys by kid.
+
+    Keys are parsed once when added. Tokens are signed with the active key
+    and verified with the key named by their kid header, using only that
+    key's algorithm; tokens without a kid are verified with the first key added.
+    """
+
+    def __init__(self) -> None:
+        self._keys: Dict[str, Tuple[str, Any, Any]] = {}
+        self._active_kid: Optional[str] = None
+        self._legacy_kid: Optional[str] = None
+
+    @staticmethod
+    def _load_key(algorithm: str, key: Optional[bytes]) -> Any:
+        if key is None:
+            return None
+        return ALGORITHMS[algorithm].prepare_key(key)
+
+    @staticmethod
+    def get_kid(public_key: bytes) -> str:
+        return hash_string(public_key.decode())[:16]
+
+    @property
+    def active_kid(self) -> Optional[str]:
+        return self._active_kid
+
+    def __contains__(self, kid: Optional[str]) -> bool:
+        return (kid or self._legacy_kid) in self._keys
+
+    def add_key(
+        self,
+        public_key: bytes,
+        private_key: Optional[bytes] = None,
+        kid: Optional[str] = None,
+        active: bool = False,
+        algorithm: str = JWT_ALGORITHM,
+    ) -> str:
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"unsupported algorithm={algorithm}")
+
+        kid = kid or self.get_kid(public_key)
+        self._keys[kid] = (
+            algorithm,
+            self._load_key(algorithm, private_key),
+            self._load_key(algorithm, public_key),
+        )
+        if self._legacy_kid is None:
+            self._legacy_kid = kid
+        if active or (self._active_kid is None and private_key is not None):
+            self.activate_key(kid)
+        return kid
+
+    def activate_key(self, kid: str) -> None:
+        if self._keys.get(kid, (None, None, None))[1] is None:
+            raise ValueError(f"no private key for kid={kid}")
+        self._active_kid = kid
+
+    def retire_key(self, kid: str) -> None:
+        if kid == self._active_kid:
+            raise ValueError(f"kid={kid} is active")
+        self._keys.pop(kid, None)
+
+    def get_signing_key(self) -> Tuple[str, str, Any]:
+        algorithm, private_key, _ = self._keys[self._active_kid]
+        return self._active_kid, algorithm, private_key
+
+    def get_verifying_key(self, kid: Optional[str]) -> Tuple[str, Any]:
+        algorithm, _, public_key = self._keys[kid or self._legacy_kid]
+        return algorithm, public_key
 
 
 class JWTBackend:
@@ -16,52 +140,119 @@ class JWTBackend:
         public_key: bytes,
         access_expiration: int,
         refresh_expiration: int,
+        token_cache_size: int = TOKEN_CACHE_SIZE,
+        algorithm: str = JWT_ALGORITHM,
     ) -> None:
         self._cache = cache_backend
-        self._private_key = private_key
-        self._public_key = public_key
+        self._algorithm = algorithm
+        self._keys = KeyRing()
+        self._keys.add_key(public_key, private_key, algorithm=algorithm)
         self._access_expiration = access_expiration
         self._refresh_expiration = refresh_expiration
+        # verified payloads by token digest, revocation is checked on every call
+        self._token_cache = LRUCache(token_cache_size)
+        self._revocation_mirror: Optional[RevocationMirror] = None
+
+    def add_key(
+        self,
+        public_key: bytes,
+        private_key: Optional[bytes] = None,
+        kid: Optional[str] = None,
+        active: bool = False,
+        algorithm: Optional[str] = None,
+    ) -> str:
+        return self._keys.add_key(
+            public_key, private_key, kid, active, algorithm or self._algorithm
+        )
 
-    async def _active_blackout_exists(self, iat: datetime) -> bool:
-        blackout = await self._cache.get("users:blackout")
+    def activate_key(self, kid: str) -> None:
+        self._keys.activate_key(kid)
+
+    def retire_key(self, kid: str) -> None:
+        self._keys.retire_key(kid)
+
+    async def start_revocation_mirror(
+        self, max_staleness: int = REVOCATION_MIRROR_MAX_STALENESS
+    ) -> None:
+        if not self._cache.supports_pubsub:
+            raise ValueError(
+                "REVOCATION_MIRROR needs a connection pool, "
+                "set_cache(await aioredis.create_redis_pool(...))"
+            )
+        if self._revocation_mirror is None:
+            self._revocation_mirror = RevocationMirror(
+                self._cache, self._access_expiration, max_staleness
+            )
+            await self._revocation_mirror.start()
+
+    async def stop_revocation_mirror(self) -> None:
+        if self._revocation_mirror is not None:
+            await self._revocation_mirror.stop()
+            self._revocation_mirror = None
+
+    @staticmethod
+    def _active_blackout_exists(blackout: Optional[str], iat: datetime) -> bool:
         if blackout is not None:
             blackout_ts = datetime.utcfromtimestamp(int(blackout))
             return blackout_ts >= iat
         else:
             return False
 
-    async def _user_in_blacklist(self, id: int) -> bool:
-        in_blacklist = await self._cache.get(f"users:blacklist:{id}")
+    @staticmethod
+    def _user_in_blacklist(in_blacklist: Optional[str]) -> bool:
         return bool(in_blacklist)
 
-    async def _user_in_logout(self, id: int, iat: datetime) -> bool:
-        ts = await self._cache.get(f"users:kick:{id}")
+    @staticmethod
+    def _user_in_logout(ts: Optional[str], iat: datetime) -> bool:
         if ts is not None:
             logout_ts = datetime.utcfromtimestamp(int(ts))
             return logout_ts >= iat
         else:
             return False
 
+    async def _is_revoked(self, id: int, iat: datetime) -> bool:
+        mirror = self._revocation_mirror
+        if mirror is not None and mirror.is_fresh:
+            return mirror.is_revoked(id, iat)
+
+        blackout, in_blacklist, ts = await self._cache.mget(
+            keys.BLACKOUT, keys.user_blacklist(id), keys.user_kick(id)
+        )
+        return (
+            self._active_blackout_exists(blackout, iat)
+            or self._user_in_blacklist(in_blacklist)
+            or self._user_in_logout(ts, iat)
+        )
+
+    def _verify_token(self, token: str, leeway: int) -> dict:
+        token_hash = hash_string(token)
+        cached = self._token_cache.get(token_hash)
+        if cached is not None:
+            payload, kid = cached
+            if kid in self._keys:
+                return dict(payload)
+            self._token_cache.delete(token_hash)
+
+        kid = jwt_api.get_unverified_header(token).get("kid")
+        algorithm, public_key = self._keys.get_verifying_key(kid)
+        payload = jwt_api.decode(
+            token, public_key, leeway=leeway, algorithms=[algorithm]
+        )
+        exp = payload.get("exp")
+        if exp is not None:
+            self._token_cache.set(
+                token_hash, (payload, kid), ttl=int(exp) - time.time()
+            )
+
+        return dict(payload)
+
     async def decode_token(self, token: str, leeway: int = 0) -> Optional[dict]:
         if token:
             try:
-                payload = jwt.decode(
-                    token,
-                    self._public_key,
-                    leeway=leeway,
-                    algorithms=JWT_ALGORITHM,
-                )
+                payload = self._verify_token(token, leeway)
                 id = payload.get("id")
                 iat = datetime.utcfromtimestamp(int(payload.get("iat")))
-                checks = await asyncio.gather(
-                    *(
-                        self._active_blackout_exists(iat),
-                        self._user_in_blacklist(id),
-                        self._user_in_logout(id, iat),
-                    )
-                )
-                if any(checks):
+                if await self._is_revoked(id, iat):
                     return None
 
                 return payload
@@ -80,7 +271,10 @@ class JWTBackend:
 
         payload.update({"iat": iat, "exp": exp, "type": token_type})
 
-        return jwt.encode(payload, self._private_key, algorithm=JWT_ALGORITHM).decode()
+        kid, algorithm, private_key = self._keys.get_signing_key()
+        return jwt_api.encode(
+            payload, private_key, algorithm=algorithm, headers={"kid": kid}
+        ).decode()
 
     def create_access_token(self, payload: dict) -> str:
         return self._create_token(payload, "access", self._access_expiration)
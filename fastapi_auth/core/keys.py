@@ -0,0 +1,59 @@
+"""Redis key schema.
+
+Keys read or scripted together share a hash tag, the part in braces, so Redis
+Cluster stores them in one slot: per-user keys are tagged with the user id,
+login protection keys with the client IP and rate limit keys with their key.
+"""
+
+from typing import Optional, Union
+
+BLACKOUT = "users:blackout"
+# ids scored by ban expiration
+BLACKLIST = "users:blacklist"
+# ids scored by kick time
+KICKS = "users:kicks"
+# flat per-user names used before the hash tags, `users:blacklist:{id}`
+LEGACY_BLACKLIST_PATTERN = "users:blacklist:*"
+LEGACY_KICK_PATTERN = "users:kick:*"
+
+
+def user_doc(id: int) -> str:
+    return f"users:{{{id}}}:doc"
+
+
+def user_version(id: int) -> str:
+    return f"users:{{{id}}}:version"
+
+
+def user_blacklist(id: int) -> str:
+    return f"users:{{{id}}}:blacklist"
+
+
+def user_kick(id: int) -> str:
+    return f"users:{{{id}}}:kick"
+
+
+def user_confirm_count(id: int) -> str:
+    return f"users:{{{id}}}:confirm:count"
+
+
+def user_reset_count(id: int) -> str:
+    return f"users:{{{id}}}:reset:count"
+
+
+def reset_token(token_hash: str) -> str:
+    return f"users:reset:token:{token_hash}"
+
+
+def login_timeout(ip: str) -> str:
+    return f"users:login:{{{ip}}}:timeout"
+
+
+def login_rate(ip: str) -> str:
+    return f"users:login:{{{ip}}}:rate"
+
+
+def rate_limit(key: str, window: Optional[Union[int, str]] = None) -> str:
+    if window is None:
+        return f"ratelimit:{{{key}}}"
+    return f"ratelimit:{{{key}}}:{window}"
@@ -1,7 +1,107 @@
+import asyncio
+import os
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Deque, Dict, Optional, Tuple
+
+from fastapi import HTTPException
 from passlib.context import CryptContext
+from passlib.hash import bcrypt
+
+from fastapi_auth.core.config import (
+    BCRYPT_MAX_ROUNDS,
+    BCRYPT_MIN_ROUNDS,
+    BCRYPT_ROUNDS,
+    PASSWORD_HASH_CONCURRENCY,
+    PASSWORD_HASH_EXECUTOR,
+    PASSWORD_HASH_QUEUE,
+    PASSWORD_HASH_RETRY_AFTER,
+    PASSWORD_HASH_WORKERS,
+)
 
 pwd_context = CryptContext(
-    schemes=["bcrypt", "django_pbkdf2_sha256"], deprecated="auto"
+    schemes=["bcrypt", "django_pbkdf2_sha256"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_MIN_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_MAX_ROUNDS,
+)
+
+_executor: Optional[Executor] = None
+
+
+class PasswordHashLimiter:
+    """Caps concurrent hash work and sheds requests once the wait queue is full.
+
+    Raises HTTPException 503 with Retry-After instead of queueing without bound.
+    """
+
+    def __init__(self, concurrency: int, queue_size: int, retry_after: int) -> None:
+        self._concurrency = concurrency
+        self._queue_size = queue_size
+        self._retry_after = retry_after
+        self._active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._admitted = 0
+        self._queued = 0
+        self._shed = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "active": self._active,
+            "waiting": len(self._waiters),
+            "admitted": self._admitted,
+            "queued": self._queued,
+            "shed": self._shed,
+        }
+
+    def _release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # hand the slot over, _active stays the same
+                waiter.set_result(None)
+                return
+        self._active -= 1
+
+    async def __aenter__(self) -> None:
+        if self._active < self._concurrency and not self._waiters:
+            self._active += 1
+            self._admitted += 1
+            return None
+
+        if len(self._waiters) >= self._queue_size:
+            self._shed += 1
+            raise HTTPException(
+                503,
+                detail="Service Unavailable",
+                headers={"Retry-After": str(self._retry_after)},
+            )
+
+        waiter = asyncio.get_event_loop().create_future()
+        self._waiters.append(waiter)
+        self._queued += 1
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            elif waiter.done() and not waiter.cancelled():
+                self._release()
+            raise
+        self._admitted += 1
+        return None
+
+    async def __aexit__(self, *args) -> None:
+        self._release()
+        return None
+
+
+password_hash_limiter = PasswordHashLimiter(
+    PASSWORD_HASH_CONCURRENCY or PASSWORD_HASH_WORKERS or os.cpu_count() or 1,
+    PASSWORD_HASH_QUEUE,
+    PASSWORD_HASH_RETRY_AFTER,
 )
 
 
@@ -11,3 +111,85 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
+
+
+def configure_bcrypt_rounds(rounds: int) -> None:
+    # cheaper hashes are upgraded on login, costlier ones are left alone
+    pwd_context.update(
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=max(rounds, BCRYPT_MAX_ROUNDS),
+    )
+
+
+def _measure_bcrypt(rounds: int) -> float:
+    start = time.perf_counter()
+    bcrypt.using(rounds=rounds).hash("calibration")
+    return (time.perf_counter() - start) * 1000
+
+
+def calibrate_bcrypt_rounds(
+    budget: float, min_rounds: int = 10, max_rounds: int = 16
+) -> Tuple[int, float]:
+    """Highest bcrypt cost whose hash time on this machine fits budget (ms).
+
+    Never goes below min_rounds. Returns the cost and its measured time.
+    """
+    _measure_bcrypt(4)  # load the backend
+
+    rounds = min_rounds
+    elapsed = _measure_bcrypt(rounds)
+    while rounds < max_rounds and elapsed * 2 <= budget:
+        next_elapsed = _measure_bcrypt(rounds + 1)
+        if next_elapsed > budget:
+            break
+        rounds, elapsed = rounds + 1, next_elapsed
+    return rounds, elapsed
+
+
+def password_needs_update(hashed_password: str) -> bool:
+    try:
+        return pwd_context.needs_update(hashed_password)
+    except (TypeError, ValueError):
+        return False
+
+
+def is_password_hash(hashed_password: str) -> bool:
+    try:
+        return pwd_context.identify(hashed_password, required=False) is not None
+    except (TypeError, ValueError):
+        return False
+
+
+def set_password_executor(executor: Executor) -> None:
+    global _executor
+    _executor = executor
+
+
+def get_password_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        max_workers = PASSWORD_HASH_WORKERS or None
+        if PASSWORD_HASH_EXECUTOR == "process":
+            _executor = ProcessPoolExecutor(max_workers=max_workers)
+        else:
+            _executor = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="password"
+            )
+    return _executor
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    loop = asyncio.get_event_loop()
+    async with password_hash_limiter:
+        return await loop.run_in_executor(
+            get_password_executor(), verify_password, plain_password, hashed_password
+        )
+
+
+async def get_password_hash_async(password: str) -> str:
+    loop = asyncio.get_event_loop()
+    async with password_hash_limiter:
+        return await loop.run_in_executor(
+            get_password_executor(), get_password_hash, password
+        )
@@ -0,0 +1,100 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Optional
+
+from fastapi_auth.core.logger import logger
+from fastapi_auth.db.backend import RedisBackend
+
+HEARTBEAT_ACTION = "HEARTBEAT"
+
+
+class Subscriber:
+    """Keeps a pub/sub subscription alive and tracks how fresh it is.
+
+    Every subscriber also publishes heartbeats to its channel, so a connection
+    that silently stopped delivering messages is detected within max_staleness.
+    """
+
+    def __init__(
+        self,
+        cache: RedisBackend,
+        channel: str,
+        handler: Callable[[dict], None],
+        on_subscribe: Optional[Callable[[], Awaitable[None]]] = None,
+        max_staleness: float = 30,
+        retry_delay: float = 1,
+    ) -> None:
+        self._cache = cache
+        self._channel = channel
+        self._handler = handler
+        self._on_subscribe = on_subscribe
+        self._max_staleness = max_staleness
+        self._retry_delay = retry_delay
+        self._subscribed = False
+        self._last_message = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_fresh(self) -> bool:
+        return (
+            self._subscribed
+            and time.monotonic() - self._last_message <= self._max_staleness
+        )
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._subscribed = False
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await self._cache.dispatch_action(self._channel, HEARTBEAT_ACTION, {})
+            await asyncio.sleep(self._max_staleness / 3)
+
+    async def _listen(self) -> None:
+        channel = await self._cache.subscribe(self._channel)
+        try:
+            if self._on_subscribe is not None:
+                await self._on_subscribe()
+            self._subscribed = True
+            self._last_message = time.monotonic()
+            heartbeat = asyncio.create_task(self._heartbeat())
+            try:
+                while await channel.wait_message():
+                    message = await channel.get_json()
+                    self._last_message = time.monotonic()
+                    if message.get("action") == HEARTBEAT_ACTION:
+                        continue
+                    try:
+                        self._handler(message)
+                    except Exception as e:
+                        logger.info(
+                            f"subscriber channel={self._channel} bad message={e!r}"
+                        )
+            finally:
+                heartbeat.cancel()
+        finally:
+            self._subscribed = False
+            try:
+                await self._cache.unsubscribe(self._channel)
+            except Exception:
+                pass
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._listen()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.info(f"subscriber channel={self._channel} error={e!r}")
+            await asyncio.sleep(self._retry_delay)
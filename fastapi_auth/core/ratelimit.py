@@ -0,0 +1,209 @@
+import math
+import secrets
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from fastapi import Depends, HTTPException, Request
+
+from fastapi_auth.core import keys
+from fastapi_auth.core.config import RATE_LIMIT_LOCAL_SIZE, TRUSTED_PROXIES
+from fastapi_auth.core.logger import logger
+from fastapi_auth.db.backend import RedisBackend, RedisScript
+from fastapi_auth.utils.cache import LRUCache
+
+# KEYS[1] - log, ARGV[1] - now, ARGV[2] - period, ARGV[3] - limit, ARGV[4] - member.
+# Times in ms. Returns {allowed, retry after ms}.
+SLIDING_LOG = RedisScript("""
+local now = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+redis.call("ZREMRANGEBYSCORE", KEYS[1], "-inf", now - period)
+if redis.call("ZCARD", KEYS[1]) < tonumber(ARGV[3]) then
+    redis.call("ZADD", KEYS[1], now, ARGV[4])
+    redis.call("PEXPIRE", KEYS[1], period)
+    return {1, 0}
+end
+local oldest = redis.call("ZRANGE", KEYS[1], 0, 0, "WITHSCORES")
+return {0, math.ceil(tonumber(oldest[2]) + period - now)}
+""")
+
+# KEYS[1] - previous window, KEYS[2] - current window, ARGV[1] - period,
+# ARGV[2] - limit, ARGV[3] - ms elapsed in the current window.
+SLIDING_WINDOW = RedisScript("""
+local period = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local elapsed = tonumber(ARGV[3])
+local previous = tonumber(redis.call("GET", KEYS[1]) or "0")
+local current = tonumber(redis.call("GET", KEYS[2]) or "0")
+if previous * (period - elapsed) / period + current >= limit then
+    local retry = period - elapsed
+    if current < limit and previous > 0 then
+        retry = math.floor(period - elapsed - (limit - current) * period / previous) + 1
+    end
+    return {0, math.max(retry, 1)}
+end
+redis.call("INCR", KEYS[2])
+redis.call("PEXPIRE", KEYS[2], period * 2)
+return {1, 0}
+""")
+
+# KEYS[1] - theoretical arrival time, ARGV[1] - now, ARGV[2] - emission
+# interval, ARGV[3] - burst.
+GCRA = RedisScript("""
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local tat = math.max(tonumber(redis.call("GET", KEYS[1]) or "0"), now)
+local allow_at = tat + interval - tonumber(ARGV[3]) * interval
+if now < allow_at then
+    return {0, math.ceil(allow_at - now)}
+end
+local new_tat = tat + interval
+redis.call("SET", KEYS[1], new_tat, "PX", math.ceil(new_tat - now))
+return {1, 0}
+""")
+
+
+class RateLimit:
+    """At most `limit` requests per `period` seconds.
+
+    Algorithms:
+        sliding_log - exact, stores a timestamp per request.
+        sliding_window - weighted count of the current and previous window.
+        gcra - token bucket refilled every period / limit, up to `burst`.
+    """
+
+    ALGORITHMS = ("sliding_log", "sliding_window", "gcra")
+
+    def __init__(
+        self,
+        limit: int,
+        period: float,
+        algorithm: str = "gcra",
+        burst: Optional[int] = None,
+    ) -> None:
+        if algorithm not in self.ALGORITHMS:
+            raise ValueError(f"unsupported algorithm={algorithm}")
+        self.limit = limit
+        self.period = period
+        self.algorithm = algorithm
+        self.burst = burst if burst is not None else limit
+
+
+# conservative policies for AuthApp(rate_limits=...), limiting is off without it
+DEFAULT_RATE_LIMITS: Dict[str, RateLimit] = {
+    "auth:register": RateLimit(10, 60 * 60, "sliding_window"),
+    "auth:refresh_access_token": RateLimit(60, 60),
+    "auth:forgot_password": RateLimit(5, 60 * 60, "sliding_log"),
+    "social:callback": RateLimit(30, 60),
+}
+
+
+def get_client_ip(request: Request) -> str:
+    """Peer address, or the nearest X-Forwarded-For hop not in TRUSTED_PROXIES."""
+    ip = request.client.host
+    if ip not in TRUSTED_PROXIES:
+        return ip
+
+    forwarded = request.headers.get("x-forwarded-for", "")
+    hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if hop not in TRUSTED_PROXIES:
+            return hop
+    return hops[0] if hops else ip
+
+
+class LocalPrefilter:
+    """Per-process copy of the shared limiter's refusals.
+
+    A key refused by Redis is remembered until its retry time and refused
+    again without a round trip. Only Redis decisions are cached: counting
+    hits locally would refuse requests that the sliding windows still allow.
+    """
+
+    def __init__(self, maxsize: int = RATE_LIMIT_LOCAL_SIZE) -> None:
+        self._blocked = LRUCache(maxsize)
+
+    def check(self, key: str) -> Optional[float]:
+        """Returns seconds to retry after if the key is blocked locally."""
+        until = self._blocked.get(key)
+        if until is not None:
+            return until - time.monotonic()
+        return None
+
+    def block(self, key: str, seconds: float) -> None:
+        if seconds > 0:
+            self._blocked.set(key, time.monotonic() + seconds, ttl=seconds)
+
+
+class RateLimiter:
+    def __init__(
+        self, cache: RedisBackend, local_size: int = RATE_LIMIT_LOCAL_SIZE
+    ) -> None:
+        self._cache = cache
+        self._local = LocalPrefilter(local_size)
+
+    async def hit(self, key: str, policy: RateLimit) -> Tuple[bool, float]:
+        """Counts a request. Returns whether it is allowed and seconds to retry after."""
+        retry_after = self._local.check(key)
+        if retry_after is not None:
+            return False, retry_after
+
+        allowed, retry_after = await self._hit(key, policy)
+        if not allowed:
+            self._local.block(key, retry_after)
+        return allowed, retry_after
+
+    async def _hit(self, key: str, policy: RateLimit) -> Tuple[bool, float]:
+        now = int(time.time() * 1000)
+        period = int(policy.period * 1000)
+        if policy.algorithm == "sliding_log":
+            member = f"{now}:{secrets.token_hex(4)}"
+            allowed, retry_after = await self._cache.run_script(
+                SLIDING_LOG, [keys.rate_limit(key)], [now, period, policy.limit, member]
+            )
+        elif policy.algorithm == "sliding_window":
+            window = now // period
+            allowed, retry_after = await self._cache.run_script(
+                SLIDING_WINDOW,
+                [keys.rate_limit(key, window - 1), keys.rate_limit(key, window)],
+                [period, policy.limit, now - window * period],
+            )
+        else:
+            allowed, retry_after = await self._cache.run_script(
+                GCRA, [keys.rate_limit(key)], [now, period / policy.limit, policy.burst]
+            )
+
+        return bool(allowed), int(retry_after) / 1000
+
+    def dependency(
+        self,
+        name: str,
+        policy: RateLimit,
+        key_func: Callable[[Request], str] = get_client_ip,
+    ) -> Callable:
+        async def rate_limit(request: Request) -> None:
+            try:
+                allowed, retry_after = await self.hit(
+                    f"{name}:{key_func(request)}", policy
+                )
+            except Exception as e:
+                # a broken limiter must not take the routes down with it
+                logger.info(f"rate_limit name={name} error={e!r}")
+                return None
+
+            if not allowed:
+                raise HTTPException(
+                    429,
+                    detail="Too many requests",
+                    headers={"Retry-After": str(math.ceil(retry_after))},
+                )
+            return None
+
+        return rate_limit
+
+
+def get_rate_limit_dependencies(
+    rate_limits: Optional[Dict[str, Callable]], name: str
+) -> List:
+    if rate_limits is not None and name in rate_limits:
+        return [Depends(rate_limits[name])]
+    return []
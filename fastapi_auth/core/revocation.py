@@ -0,0 +1,97 @@
+import time
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from fastapi_auth.core import keys
+from fastapi_auth.core.config import REVOCATION_CHANNEL
+from fastapi_auth.core.pubsub import Subscriber
+from fastapi_auth.db.backend import RedisBackend
+
+
+class RevocationMirror:
+    """Per-process copy of the blackout, blacklist and kick keys.
+
+    Seeded from Redis on every (re)subscribe and kept current by the actions
+    UsersManagementMixin publishes to REVOCATION_CHANNEL. Callers must fall
+    back to Redis while is_fresh is False.
+    """
+
+    def __init__(
+        self, cache: RedisBackend, expiration: int, max_staleness: float
+    ) -> None:
+        self._cache = cache
+        self._expiration = expiration
+        self._blackout: Optional[int] = None
+        self._blacklist: Dict[int, float] = {}
+        self._kick: Dict[int, Tuple[int, float]] = {}
+        self._subscriber = Subscriber(
+            cache, REVOCATION_CHANNEL, self.apply, self.seed, max_staleness
+        )
+
+    @property
+    def is_fresh(self) -> bool:
+        return self._subscriber.is_fresh
+
+    async def start(self) -> None:
+        await self._subscriber.start()
+
+    async def stop(self) -> None:
+        await self._subscriber.stop()
+
+    async def seed(self) -> None:
+        now = time.time()
+        blackout = await self._cache.get(keys.BLACKOUT)
+        blacklist = await self._cache.zrangebyscore_withscores(
+            keys.BLACKLIST, now, float("inf")
+        )
+        kicks = await self._cache.zrangebyscore_withscores(
+            keys.KICKS, now - self._expiration, float("inf")
+        )
+
+        monotonic = time.monotonic()
+        self._blackout = int(blackout) if blackout is not None else None
+        self._blacklist = {
+            int(id): monotonic + float(expires_at) - now for id, expires_at in blacklist
+        }
+        self._kick = {
+            int(id): (int(ts), monotonic + float(ts) + self._expiration - now)
+            for id, ts in kicks
+        }
+
+    def apply(self, message: dict) -> None:
+        action = message.get("action")
+        payload = message.get("payload")
+        deadline = time.monotonic() + self._expiration
+
+        if action == "BLACKLIST_ADD":
+            self._blacklist[int(payload.get("id"))] = deadline
+        elif action == "BLACKLIST_REMOVE":
+            self._blacklist.pop(int(payload.get("id")), None)
+        elif action == "KICK":
+            self._kick[int(payload.get("id"))] = (int(payload.get("ts")), deadline)
+        elif action == "BLACKOUT_SET":
+            self._blackout = int(payload.get("ts"))
+        elif action == "BLACKOUT_DELETE":
+            self._blackout = None
+
+    def is_revoked(self, id: int, iat: datetime) -> bool:
+        if self._blackout is not None:
+            if datetime.utcfromtimestamp(self._blackout) >= iat:
+                return True
+
+        now = time.monotonic()
+
+        deadline = self._blacklist.get(id)
+        if deadline is not None:
+            if deadline > now:
+                return True
+            del self._blacklist[id]
+
+        kick = self._kick.get(id)
+        if kick is not None:
+            ts, deadline = kick
+            if deadline > now:
+                return datetime.utcfromtimestamp(ts) >= iat
+            del self._kick[id]
+
+        return False
@@ -1,2 +1,2 @@
 from .mongodb import MongoDBBackend
-from .redis import RedisBackend
+from .redis import RedisBackend, RedisPipeline, RedisScript
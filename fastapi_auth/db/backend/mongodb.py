@@ -1,16 +1,105 @@
-from typing import Iterable, Optional, Tuple
+import asyncio
+from typing import Any, Callable, Iterable, List, Optional, Tuple
 
 from motor.motor_asyncio import (
     AsyncIOMotorClient,
     AsyncIOMotorCollection,
     AsyncIOMotorDatabase,
 )
-from pymongo import ReturnDocument
+from pymongo import ASCENDING, IndexModel, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+
+from fastapi_auth.core.config import (
+    SEARCH_ESTIMATE_LIMIT,
+    USER_ID_BLOCK_SIZE,
+    USERNAME_TRIGRAMS,
+)
+from fastapi_auth.exceptions import IndexConflictError
+
+USERS_INDEXES = [
+    IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+    IndexModel([("username_lower", ASCENDING)], name="username_lower"),
+    IndexModel(
+        [("provider", ASCENDING), ("sid", ASCENDING)],
+        name="provider_sid_unique",
+        unique=True,
+        partialFilterExpression={"provider": {"$exists": True}},
+    ),
+    # banned users only, the blacklist pages seek it by id
+    IndexModel(
+        [("active", ASCENDING), ("id", ASCENDING)],
+        name="blacklist",
+        partialFilterExpression={"active": False},
+    ),
+]
+
+if USERNAME_TRIGRAMS:
+    USERS_INDEXES.append(
+        IndexModel([("username_trigrams", ASCENDING)], name="username_trigrams")
+    )
+
+EMAIL_CONFIRMATIONS_INDEXES = [
+    IndexModel([("token", ASCENDING)], name="token"),
+    IndexModel([("email", ASCENDING)], name="email"),
+]
+
+
+class IdAllocator:
+    """Hands out ids from blocks reserved on the counters collection (hi/lo).
+
+    A block is reserved with one atomic $inc, so ids stay unique across
+    processes. Ids left in a block when the process exits are never used.
+    """
+
+    def __init__(self, name: str, block_size: int = USER_ID_BLOCK_SIZE) -> None:
+        self._name = name
+        self._block_size = max(block_size, 1)
+        self._next = 0
+        self._end = 0
+        self._reserving: Optional[asyncio.Future] = None
+
+    async def _reserve(self, counters: AsyncIOMotorCollection, size: int) -> None:
+        ret = await counters.find_one_and_update(
+            {"name": self._name},
+            {"$inc": {"c": size}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        # the counter holds the last reserved id
+        self._end = ret.get("c") + 1
+        self._next = self._end - size
+
+    def _reset(self, future: asyncio.Future) -> None:
+        self._reserving = None
+
+    async def allocate(
+        self, counters: AsyncIOMotorCollection, count: int = 1
+    ) -> List[int]:
+        ids: List[int] = []
+        while len(ids) < count:
+            if self._next >= self._end:
+                # one reservation in flight, concurrent callers share it
+                if self._reserving is None:
+                    size = max(count - len(ids), self._block_size)
+                    self._reserving = asyncio.ensure_future(
+                        self._reserve(counters, size)
+                    )
+                    self._reserving.add_done_callback(self._reset)
+                await self._reserving
+                continue
+
+            n = min(count - len(ids), self._end - self._next)
+            ids.extend(range(self._next, self._next + n))
+            self._next += n
+        return ids
 
 
 class MongoDBBackend:
     def __init__(self, database_name: str = "test") -> None:
         self._database_name = database_name
+        self._ids = IdAllocator("users")
 
     def set_client(self, client: AsyncIOMotorClient) -> None:
         self._client = client
@@ -26,22 +115,91 @@ class MongoDBBackend:
 
         self._settings: AsyncIOMotorCollection = self._db["settings"]
 
-    async def _increment_id(self) -> int:
-        ret = await self._counters.find_one_and_update(
-            {"name": "users"},
-            {"$inc": {"c": 1}},
-            return_document=ReturnDocument.AFTER,
+    async def ensure_indexes(self, create: bool = True) -> List[str]:
+        """Returns indexes that were missing, creating them if create is True.
+
+        An existing index with the same keys counts as present whatever its name,
+        as long as its unique and partial filter options match. Mismatched
+        options, or duplicates blocking a unique index, raise IndexConflictError.
+        """
+        missing: List[str] = []
+        for collection, indexes in (
+            (self._users, USERS_INDEXES),
+            (self._email_confirmations, EMAIL_CONFIRMATIONS_INDEXES),
+        ):
+            existing = {
+                self._index_key(info.get("key")): (name, self._index_options(info))
+                for name, info in (await collection.index_information()).items()
+            }
+            models = []
+            for index in indexes:
+                document = index.document
+                key = self._index_key(document.get("key").items())
+                if key not in existing:
+                    models.append(index)
+                    continue
+                existing_name, options = existing[key]
+                if options != self._index_options(document):
+                    raise IndexConflictError(
+                        f"{collection.name}.{document.get('name')} exists as "
+                        f"{existing_name} with options unique={options[0]} "
+                        f"partialFilterExpression={options[1]}, drop it to recreate"
+                    )
+            missing.extend(
+                f"{collection.name}.{index.document.get('name')}" for index in models
+            )
+            if create and models:
+                try:
+                    await collection.create_indexes(models)
+                except OperationFailure as e:
+                    reason = (
+                        "duplicate values, remove them first"
+                        if e.code == 11000
+                        else "conflicts with an existing index"
+                    )
+                    raise IndexConflictError(
+                        f"{collection.name}: index creation failed, {reason}: {e}"
+                    ) from e
+        return missing
+
+    @staticmethod
+    def _index_key(key: Iterable[Tuple[str, Any]]) -> Tuple[Tuple[str, Any], ...]:
+        return tuple(
+            (field, direction if isinstance(direction, str) else int(direction))
+            for field, direction in key
         )
-        return ret.get("c")
 
-    async def get(self, id: int) -> Optional[dict]:
-        return await self._users.find_one({"id": id}, {"_id": 0})
+    @staticmethod
+    def _index_options(info: dict) -> Tuple[bool, Optional[dict]]:
+        partial = info.get("partialFilterExpression")
+        return bool(info.get("unique")), None if partial is None else dict(partial)
+
+    async def allocate_ids(self, count: int = 1) -> List[int]:
+        return await self._ids.allocate(self._counters, count)
+
+    @staticmethod
+    def _projection(fields: Optional[Iterable[str]]) -> dict:
+        projection = {"_id": 0}
+        if fields is not None:
+            projection.update({field: 1 for field in fields})
+        return projection
 
-    async def get_by_email(self, email: str) -> Optional[dict]:
-        return await self._users.find_one({"email": email}, {"_id": 0})
+    async def get(
+        self, id: int, fields: Optional[Iterable[str]] = None
+    ) -> Optional[dict]:
+        return await self._users.find_one({"id": id}, self._projection(fields))
 
-    async def get_by_username(self, username: str) -> Optional[dict]:
-        return await self._users.find_one({"username": username}, {"_id": 0})
+    async def get_by_email(
+        self, email: str, fields: Optional[Iterable[str]] = None
+    ) -> Optional[dict]:
+        return await self._users.find_one({"email": email}, self._projection(fields))
+
+    async def get_by_username(
+        self, username: str, fields: Optional[Iterable[str]] = None
+    ) -> Optional[dict]:
+        return await self._users.find_one(
+            {"username": username}, self._projection(fields)
+        )
 
     async def get_by_social(self, provider: str, sid: str) -> Optional[dict]:
         return await self._users.find_one(
@@ -49,13 +207,54 @@ class MongoDBBackend:
         )
 
     async def create(self, obj: dict) -> int:
-        async with await self._client.start_session() as session:
-            async with session.start_transaction():
-                id = await self._increment_id()
-                obj.update({"id": id})
-                await self._users.insert_one(obj)
+        (id,) = await self.allocate_ids()
+        obj.update({"id": id})
+        await self._users.insert_one(obj)
         return id
 
+    async def insert_many(self, objs: List[dict]) -> List[Tuple[int, str]]:
+        """Unordered insert, returns (index, message) for every rejected document."""
+        try:
+            await self._users.insert_many(objs, ordered=False)
+        except BulkWriteError as e:
+            return [
+                (error.get("index"), error.get("errmsg"))
+                for error in e.details.get("writeErrors", [])
+            ]
+        return []
+
+    async def backfill(
+        self,
+        missing: str,
+        fields: Iterable[str],
+        compute: Callable[[dict], dict],
+        batch_size: int = 1000,
+    ) -> int:
+        """Sets compute(item) on every user with `fields` but without `missing`.
+
+        Items compute returns nothing for are left as they are.
+        """
+        updated = 0
+        requests: List[UpdateOne] = []
+        query: dict = {missing: {"$exists": False}}
+        query.update({field: {"$ne": None} for field in fields})
+        cursor = self._users.find(query, {field: 1 for field in fields}).batch_size(
+            batch_size
+        )
+        async for item in cursor:
+            values = compute(item)
+            if not values:
+                continue
+            requests.append(UpdateOne({"_id": item.get("_id")}, {"$set": values}))
+            if len(requests) >= batch_size:
+                await self._users.bulk_write(requests, ordered=False)
+                updated += len(requests)
+                requests = []
+        if requests:
+            await self._users.bulk_write(requests, ordered=False)
+            updated += len(requests)
+        return updated
+
     async def update(self, id: int, obj: dict) -> bool:
         res = await self._users.update_one({"id": id}, {"$set": obj})
         return bool(res.matched_count)
@@ -73,25 +272,49 @@ class MongoDBBackend:
         )
         return None
 
-    async def confirm_email(self, token_hash: str) -> bool:
+    async def confirm_email(self, token_hash: str) -> Optional[int]:
+        """Returns id of the confirmed user."""
         ec = await self._email_confirmations.find_one({"token": token_hash})
         if ec is not None:
             email = ec.get("email")
             async with await self._client.start_session() as session:
                 async with session.start_transaction():
-                    await self._users.update_one(
-                        {"email": email}, {"$set": {"confirmed": True}}
+                    item = await self._users.find_one_and_update(
+                        {"email": email},
+                        {"$set": {"confirmed": True}},
+                        projection={"_id": 0, "id": 1},
                     )
                     await self._email_confirmations.delete_many({"email": email})
-            return True
+            return item.get("id") if item is not None else None
         else:
-            return False
+            return None
 
-    async def get_blacklist(self) -> Iterable[dict]:
-        return await self._users.find({"active": False}, {"_id": 0}).to_list(None)
+    async def get_blacklist(self, after: Optional[int], size: int) -> List[dict]:
+        """Seeks the partial blacklist index, returns size + 1 items to detect the next page."""
+        query: dict = {"active": False}
+        if after is not None:
+            query.update({"id": {"$gt": after}})
+        return (
+            await self._users.find(query, {"_id": 0, "id": 1, "username": 1})
+            .sort("id", ASCENDING)
+            .limit(size + 1)
+            .to_list(None)
+        )
 
-    async def search(self, f: dict, p: int, size: int) -> Tuple[dict, int]:
-        count = await self._users.count_documents(f)
+    async def _search_count(self, f: dict, total: str) -> Optional[int]:
+        if total == "exact":
+            return await self._users.count_documents(f)
+        elif total == "estimate":
+            if not f:
+                return await self._users.estimated_document_count()
+            return await self._users.count_documents(f, limit=SEARCH_ESTIMATE_LIMIT)
+        else:
+            return None
+
+    async def search(
+        self, f: dict, p: int, size: int, total: str = "exact"
+    ) -> Tuple[List[dict], Optional[int]]:
+        count = await self._search_count(f, total)
         items = (
             await self._users.find(f, {"_id": 0})
             .skip((p - 1) * size)
@@ -99,3 +322,17 @@ class MongoDBBackend:
             .to_list(None)
         )
         return items, count
+
+    async def search_after(
+        self, f: dict, after: Optional[int], size: int, total: str = "exact"
+    ) -> Tuple[List[dict], Optional[int]]:
+        """Seeks on the id index, returns up to size + 1 items to detect the next page."""
+        count = await self._search_count(f, total)
+        query = {"$and": [f, {"id": {"$gt": after}}]} if after is not None else f
+        items = (
+            await self._users.find(query, {"_id": 0})
+            .sort("id", ASCENDING)
+            .limit(size + 1)
+            .to_list(None)
+        )
+        return items, count
@@ -1,41 +1,234 @@
-from typing import Iterable, Optional, Union
+import asyncio
+import hashlib
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
 
-from aioredis import Redis
+from aioredis import Channel, Redis
+from aioredis.abc import AbcConnection, AbcPool
+from aioredis.errors import ReplyError
+
+from fastapi_auth.core.config import REDIS_CLUSTER
+
+CLUSTER_SLOTS = 16384
+
+
+def crc16(data: bytes) -> int:
+    """CRC16-XMODEM, the checksum Redis Cluster hashes keys with."""
+    crc = 0
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = (crc << 1) ^ 0x1021 if crc & 0x8000 else crc << 1
+        crc &= 0xFFFF
+    return crc
+
+
+def key_slot(key: str) -> int:
+    """Cluster slot of the key, only its hash tag is hashed when it has one."""
+    data = key.encode()
+    start = data.find(b"{") + 1
+    if start:
+        end = data.find(b"}", start)
+        if end > start:
+            data = data[start:end]
+    return crc16(data) % CLUSTER_SLOTS
+
+
+class RedisScript:
+    """Lua script called by digest, loaded on the first NOSCRIPT reply."""
+
+    def __init__(self, source: str) -> None:
+        self.source = source
+        self.sha = hashlib.sha1(source.encode()).hexdigest()
+
+
+class RedisPipeline:
+    """Commands queued for one round trip.
+
+    Every method returns a future that is resolved once the pipeline is sent.
+    """
+
+    def __init__(self, pipe: Any) -> None:
+        self._pipe = pipe
+
+    def get(self, key: str) -> asyncio.Future:
+        return self._pipe.get(key)
+
+    def delete(self, key: str) -> asyncio.Future:
+        return self._pipe.delete(key)
+
+    def pttl(self, key: str) -> asyncio.Future:
+        return self._pipe.pttl(key)
+
+    def set(
+        self, key: str, value: Union[str, bytes, int], expire: Optional[int] = None
+    ) -> asyncio.Future:
+        return self._pipe.set(key, value, expire=expire or 0)
+
+    def zadd(self, key: str, score: float, member: Union[str, int]) -> asyncio.Future:
+        return self._pipe.zadd(key, score, member)
+
+    def zrem(self, key: str, member: Union[str, int]) -> asyncio.Future:
+        return self._pipe.zrem(key, member)
+
+    def zrangebyscore(
+        self, key: str, min: float = float("-inf"), max: float = float("inf")
+    ) -> asyncio.Future:
+        return self._pipe.zrangebyscore(key, min, max)
+
+    def zremrangebyscore(self, key: str, min: float, max: float) -> asyncio.Future:
+        return self._pipe.zremrangebyscore(key, min, max)
 
 
 class RedisBackend:
     _redis: Optional[Redis] = None
 
+    def __init__(self, cluster: bool = REDIS_CLUSTER) -> None:
+        self._cluster = cluster
+
     def set_client(self, redis: Redis) -> None:
         self._redis = redis
 
     async def get(self, key: str) -> str:
         return await self._redis.get(key)
 
+    async def mget(self, key: str, *keys: str) -> List[Optional[str]]:
+        if not self._cluster:
+            return await self._redis.mget(key, *keys)
+
+        # one MGET per slot, sent concurrently
+        all_keys = (key, *keys)
+        slots: Dict[int, List[int]] = {}
+        for i, k in enumerate(all_keys):
+            slots.setdefault(key_slot(k), []).append(i)
+        groups = list(slots.values())
+        replies = await asyncio.gather(
+            *(self._redis.mget(*(all_keys[i] for i in group)) for group in groups)
+        )
+
+        values: List[Optional[str]] = [None] * len(all_keys)
+        for group, reply in zip(groups, replies):
+            for i, value in zip(group, reply):
+                values[i] = value
+        return values
+
     async def delete(self, key: str) -> None:
         await self._redis.delete(key)
         return None
 
-    async def keys(self, match: str) -> Iterable[str]:
-        return await self._redis.keys(match)
+    async def scan(self, match: str, count: int = 1000) -> AsyncIterator[str]:
+        """Keys matching the pattern, walked with a cursor instead of KEYS.
+
+        In cluster mode every master is scanned, each only holds its own slots.
+        """
+        nodes = await self._redis.all_masters() if self._cluster else [self._redis]
+        for node in nodes:
+            async for key in node.iscan(match=match, count=count):
+                yield key
 
     async def set(
-        self, key: str, value: Union[str, bytes, int], expire: int = 0
+        self, key: str, value: Union[str, bytes, int], expire: Optional[int] = None
     ) -> None:
-        await self._redis.set(key, value, expire=expire)
+        await self._redis.set(key, value, expire=expire or 0)
         return None
 
-    async def setnx(self, key: str, value: Union[str, bytes, int], expire: int) -> None:
-        await self._redis.setnx(key, value)
-        await self._redis.expire(key, expire)
-        return None
+    async def setnx(
+        self, key: str, value: Union[str, bytes, int], expire: Optional[int] = None
+    ) -> bool:
+        """SET NX EX, the key never exists without its expiration."""
+        return await self._redis.set(
+            key, value, expire=expire or 0, exist=Redis.SET_IF_NOT_EXIST
+        )
+
+    async def getset(
+        self, key: str, value: Union[str, bytes, int], expire: Optional[int] = None
+    ) -> Optional[str]:
+        """Sets the key and returns its previous value."""
+        if not expire:
+            return await self._redis.getset(key, value)
+
+        tr = self._redis.multi_exec()
+        previous = tr.getset(key, value)
+        tr.expire(key, expire)
+        await tr.execute()
+        return await previous
+
+    @asynccontextmanager
+    async def pipeline(self, transaction: bool = True) -> AsyncIterator[RedisPipeline]:
+        """Sends the queued commands on exit, as MULTI/EXEC unless `transaction` is off.
+
+        In cluster mode the commands may span slots, so they are never sent as
+        a transaction.
+        """
+        if transaction and not self._cluster:
+            pipe = self._redis.multi_exec()
+        else:
+            pipe = self._redis.pipeline()
+        yield RedisPipeline(pipe)
+        await pipe.execute()
+
+    async def pttl(self, key: str) -> int:
+        return await self._redis.pttl(key)
 
     async def incr(self, key: str) -> str:
         return await self._redis.incr(key)
 
+    async def zadd(self, key: str, score: float, member: Union[str, int]) -> None:
+        await self._redis.zadd(key, score, member)
+        return None
+
+    async def zrem(self, key: str, member: Union[str, int]) -> None:
+        await self._redis.zrem(key, member)
+        return None
+
+    async def zrangebyscore(
+        self, key: str, min: float = float("-inf"), max: float = float("inf")
+    ) -> List[str]:
+        return await self._redis.zrangebyscore(key, min, max)
+
+    async def zrangebyscore_withscores(
+        self, key: str, min: float = float("-inf"), max: float = float("inf")
+    ) -> List[Tuple[str, float]]:
+        return await self._redis.zrangebyscore(key, min, max, withscores=True)
+
+    async def zremrangebyscore(self, key: str, min: float, max: float) -> None:
+        await self._redis.zremrangebyscore(key, min, max)
+        return None
+
+    async def run_script(
+        self, script: RedisScript, keys: List[str], args: List[Any]
+    ) -> Any:
+        try:
+            return await self._redis.evalsha(script.sha, keys, args)
+        except ReplyError as e:
+            if not str(e).startswith("NOSCRIPT"):
+                raise
+        await self._redis.script_load(script.source)
+        return await self._redis.evalsha(script.sha, keys, args)
+
     # async def incrby(self, key: str, i: int) -> str:
     #     return await self._redis.incrby(key, i)
 
     async def dispatch_action(self, channel: str, action: str, payload: dict) -> None:
         await self._redis.publish_json(channel, {"action": action, "payload": payload})
         return None
+
+    @property
+    def supports_pubsub(self) -> bool:
+        """A single connection stays in subscribe mode, only pools keep one apart."""
+        connection = getattr(self._redis, "connection", None)
+        return not isinstance(connection, AbcConnection) or isinstance(
+            connection, AbcPool
+        )
+
+    async def subscribe(self, channel: str) -> Channel:
+        if not self.supports_pubsub:
+            raise TypeError(
+                "pub/sub needs a connection pool, use aioredis.create_redis_pool"
+            )
+        (ch,) = await self._redis.subscribe(channel)
+        return ch
+
+    async def unsubscribe(self, channel: str) -> None:
+        await self._redis.unsubscribe(channel)
+        return None
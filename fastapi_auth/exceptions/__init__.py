@@ -1 +1,2 @@
+from .indexes import IndexConflictError
 from .social import SocialException
@@ -0,0 +1,2 @@
+class IndexConflictError(Exception):
+    """An index can't be created as defined, the collection needs fixing first."""
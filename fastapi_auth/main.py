@@ -1,10 +1,20 @@
-from typing import Iterable, Optional
+from typing import Any, AsyncIterable, Callable, Dict, Iterable, List, Optional
 
 from aioredis import Redis
 from fastapi import APIRouter, HTTPException, Request
 from motor.motor_asyncio import AsyncIOMotorClient
 
+from fastapi_auth.core.config import (
+    BACKFILL_SEARCH_FIELDS,
+    ENSURE_INDEXES,
+    IMPORT_BATCH_SIZE,
+    MIGRATE_REVOCATION_KEYS,
+    REVOCATION_MIRROR,
+)
 from fastapi_auth.core.jwt import JWTBackend
+from fastapi_auth.core.logger import logger
+from fastapi_auth.core.password import calibrate_bcrypt_rounds, configure_bcrypt_rounds
+from fastapi_auth.core.ratelimit import RateLimit, RateLimiter, get_client_ip
 from fastapi_auth.core.user import User
 from fastapi_auth.db.backend import MongoDBBackend, RedisBackend
 from fastapi_auth.repositories import UsersRepo
@@ -15,6 +25,7 @@ from fastapi_auth.routers import (
     get_search_router,
     get_social_router,
 )
+from fastapi_auth.services import ImportService
 
 
 class Auth:
@@ -41,12 +52,45 @@ class Auth:
     def set_cache(self, client: Redis) -> None:
         self._cache_backend.set_client(client)
 
+    def add_key(
+        self,
+        public_key: bytes,
+        private_key: Optional[bytes] = None,
+        kid: Optional[str] = None,
+        active: bool = False,
+        algorithm: Optional[str] = None,
+    ) -> str:
+        return self._auth_backend.add_key(
+            public_key, private_key, kid, active, algorithm
+        )
+
+    def activate_key(self, kid: str) -> None:
+        self._auth_backend.activate_key(kid)
+
+    def retire_key(self, kid: str) -> None:
+        self._auth_backend.retire_key(kid)
+
+    async def startup(self) -> None:
+        if REVOCATION_MIRROR:
+            await self._auth_backend.start_revocation_mirror()
+
+    async def shutdown(self) -> None:
+        await self._auth_backend.stop_revocation_mirror()
+
+    async def _get_request_user(self, request: Request) -> User:
+        # memoized per request, so any combination of dependencies decodes once
+        user = getattr(request.state, "auth_user", None)
+        if user is None:
+            access_token = request.cookies.get(self._access_cookie_name)
+            if access_token:
+                user = await User.create(access_token, self._auth_backend)
+            else:
+                user = User()
+            request.state.auth_user = user
+        return user
+
     async def get_user(self, request: Request) -> User:
-        access_token = request.cookies.get(self._access_cookie_name)
-        if access_token:
-            return await User.create(access_token, self._auth_backend)
-        else:
-            return User()
+        return await self._get_request_user(request)
 
     async def get_authenticated_user(
         self,
@@ -54,14 +98,14 @@ class Auth:
     ) -> User:
         access_token = request.cookies.get(self._access_cookie_name)
         if access_token:
-            return await User.create(access_token, self._auth_backend)
+            return await self._get_request_user(request)
         else:
             raise HTTPException(401)
 
     async def admin_required(self, request: Request) -> None:
         access_token = request.cookies.get(self._access_cookie_name)
         if access_token:
-            user = await User.create(access_token, self._auth_backend)
+            user = await self._get_request_user(request)
             if user.is_admin:
                 return
 
@@ -91,6 +135,9 @@ class AuthApp(Auth):
         recaptcha_secret: str,
         social_providers: Iterable,
         social_creds: Optional[dict],
+        bcrypt_latency_budget: Optional[float] = None,
+        rate_limits: Optional[Dict[str, RateLimit]] = None,
+        rate_limit_key: Callable[[Request], str] = get_client_ip,
     ) -> None:
         self._debug = debug
         self._language = language
@@ -112,6 +159,13 @@ class AuthApp(Auth):
         self._social_providers = social_providers
         self._social_creds = social_creds
 
+        if bcrypt_latency_budget is not None:
+            rounds, elapsed = calibrate_bcrypt_rounds(bcrypt_latency_budget)
+            configure_bcrypt_rounds(rounds)
+            logger.info(
+                f"bcrypt_calibration budget={bcrypt_latency_budget}ms rounds={rounds} time={elapsed:.1f}ms"
+            )
+
         self._database_backend = MongoDBBackend(self._database_name)
         self._cache_backend = RedisBackend()
 
@@ -126,6 +180,14 @@ class AuthApp(Auth):
         self._users_repo = UsersRepo(
             self._database_backend, self._cache_backend, callbacks, access_expiration
         )
+        ImportService.setup(self._users_repo)
+
+        # route name -> policy, routes without one are not limited
+        self._rate_limiter = RateLimiter(self._cache_backend)
+        self._rate_limits = {
+            name: self._rate_limiter.dependency(name, policy, rate_limit_key)
+            for name, policy in (rate_limits or {}).items()
+        }
 
     @property
     def auth_router(self) -> APIRouter:
@@ -147,6 +209,7 @@ class AuthApp(Auth):
             self._smtp_host,
             self._smtp_tls,
             self._display_name,
+            self._rate_limits,
         )
 
     @property
@@ -165,6 +228,7 @@ class AuthApp(Auth):
             self._smtp_host,
             self._smtp_tls,
             self._display_name,
+            self._rate_limits,
         )
 
     @property
@@ -181,6 +245,7 @@ class AuthApp(Auth):
             self._refresh_expiration,
             self._social_providers,
             self._social_creds,
+            self._rate_limits,
         )
 
     @property
@@ -194,5 +259,41 @@ class AuthApp(Auth):
     def set_database(self, database_client: AsyncIOMotorClient) -> None:
         self._database_backend.set_client(database_client)
 
+    async def ensure_indexes(self, create: bool = True) -> List[str]:
+        missing = await self._database_backend.ensure_indexes(create)
+        for name in missing:
+            logger.info(f"ensure_indexes missing={name} created={create}")
+        return missing
+
+    async def backfill_search_fields(self) -> int:
+        updated = await self._users_repo.backfill_search_fields()
+        logger.info(f"backfill_search_fields updated={updated}")
+        return updated
+
+    async def import_users(
+        self,
+        records: AsyncIterable[dict],
+        batch_size: int = IMPORT_BATCH_SIZE,
+        progress: Optional[Callable[[dict], Any]] = None,
+    ) -> dict:
+        return await ImportService().import_users(records, batch_size, progress)
+
+    async def migrate_revocation_keys(self) -> int:
+        return await self._users_repo.migrate_revocation_keys()
+
+    async def startup(self) -> None:
+        if MIGRATE_REVOCATION_KEYS:
+            # before the revocation mirror seeds from the new key names
+            await self.migrate_revocation_keys()
+        await super().startup()
+        await self.ensure_indexes(ENSURE_INDEXES)
+        if BACKFILL_SEARCH_FIELDS:
+            await self.backfill_search_fields()
+        await self._users_repo.start_local_cache()
+
+    async def shutdown(self) -> None:
+        await self._users_repo.stop_local_cache()
+        await super().shutdown()
+
     # def set_cache(self, cache_client: Redis) -> None:
     #     self._cache_backend.set_client(cache_client)
@@ -1,10 +1,25 @@
 import asyncio
+import copy
+import math
 import re
+import time
 from datetime import datetime
-from typing import Iterable, Optional, Tuple
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
+import orjson
 from email_validator import EmailNotValidError, validate_email
 
+from fastapi_auth.core import keys
 from fastapi_auth.core.config import (
     EMAIL_CONFIRMATION_MAX,
     EMAIL_CONFIRMATION_TIMEOUT,
@@ -12,9 +27,26 @@ from fastapi_auth.core.config import (
     PASSWORD_RESET_LIFETIME,
     PASSWORD_RESET_MAX,
     PASSWORD_RESET_TIMEOUT,
+    REVOCATION_CHANNEL,
+    USER_CACHE_TTL,
+    USER_LOCAL_CACHE_MAX_STALENESS,
+    USER_LOCAL_CACHE_SIZE,
+    USER_LOCAL_CACHE_TTL,
+    USERNAME_TRIGRAMS,
+    USERS_CHANNEL,
 )
 from fastapi_auth.core.logger import logger
-from fastapi_auth.db.backend import MongoDBBackend, RedisBackend
+from fastapi_auth.core.pubsub import Subscriber
+from fastapi_auth.core.ratelimit import LocalPrefilter
+from fastapi_auth.db.backend import MongoDBBackend, RedisBackend, RedisScript
+from fastapi_auth.utils.cache import LRUCache
+from fastapi_auth.utils.strings import (
+    create_random_string,
+    get_trigrams,
+    normalize_username,
+)
+
+Fields = Iterable[str]
 
 
 class Base:
@@ -30,93 +62,356 @@ class Base:
         self._callbacks = callbacks
         self._access_expiration = access_expiration
 
+        # per-process tier in front of Redis, only used while subscribed
+        self._local_users = LRUCache(USER_LOCAL_CACHE_SIZE, USER_LOCAL_CACHE_TTL)
+        self._local_ids = LRUCache(USER_LOCAL_CACHE_SIZE, USER_LOCAL_CACHE_TTL)
+        # id -> [reads in flight, invalidation generation]
+        self._local_reads: Dict[int, List[int]] = {}
+        self._local_subscriber = Subscriber(
+            cache,
+            USERS_CHANNEL,
+            self._apply_invalidation,
+            self._clear_local,
+            USER_LOCAL_CACHE_MAX_STALENESS,
+        )
+        # refuses login floods in-process before they reach Redis
+        self._login_prefilter = LocalPrefilter()
+
+    @property
+    def _local_enabled(self) -> bool:
+        return USER_LOCAL_CACHE_SIZE > 0 and self._local_subscriber.is_fresh
+
+    async def start_local_cache(self) -> None:
+        if USER_LOCAL_CACHE_SIZE > 0:
+            if not self._cache.supports_pubsub:
+                logger.info("local_cache disabled, pub/sub needs a connection pool")
+                return None
+            await self._local_subscriber.start()
+
+    async def stop_local_cache(self) -> None:
+        await self._local_subscriber.stop()
+        await self._clear_local()
+
+    async def _clear_local(self) -> None:
+        # invalidations may have been missed while unsubscribed
+        self._local_users.clear()
+        self._local_ids.clear()
+        for read in self._local_reads.values():
+            read[1] += 1
+
+    def _drop_local(self, id: int) -> None:
+        self._local_users.delete(id)
+        # reads already past the local tier must not remember what they load
+        read = self._local_reads.get(id)
+        if read is not None:
+            read[1] += 1
+
+    def _apply_invalidation(self, message: dict) -> None:
+        if message.get("action") == "INVALIDATE":
+            self._drop_local(int(message.get("payload").get("id")))
+
+    def _remember(self, item: dict) -> None:
+        id = item.get("id")
+        self._local_users.set(id, copy.deepcopy(item))
+        for field in ("email", "username"):
+            if item.get(field) is not None:
+                self._local_ids.set((field, item.get(field)), id)
+
+    @staticmethod
+    def _search_fields(username: str) -> dict:
+        username_lower = normalize_username(username)
+        fields: dict = {"username_lower": username_lower}
+        if USERNAME_TRIGRAMS:
+            fields.update({"username_trigrams": get_trigrams(username_lower)})
+        return fields
+
+    def _with_search_fields(self, obj: dict) -> dict:
+        if obj.get("username") is not None:
+            obj.update(self._search_fields(obj.get("username")))
+        return obj
+
 
 class UsersCRUDMixin(Base):
-    async def get(self, id: int) -> Optional[dict]:
-        return await self._database.get(id)
+    @staticmethod
+    def _serialize(item: dict, version: Optional[str]) -> bytes:
+        return orjson.dumps({"version": version, "item": item})
+
+    @staticmethod
+    def _deserialize(data: Union[str, bytes]) -> Tuple[Optional[str], dict]:
+        cached = orjson.loads(data)
+        item = cached.get("item")
+        for field in ("created_at", "last_login"):
+            if isinstance(item.get(field), str):
+                item[field] = datetime.fromisoformat(item[field])
+        return cached.get("version"), item
+
+    async def _invalidate(self, id: int) -> None:
+        self._drop_local(id)
+        async with self._cache.pipeline() as pipe:
+            if USER_CACHE_TTL:
+                # documents read from the database before this write carry
+                # the previous version and are ignored, even if set after it
+                pipe.set(
+                    keys.user_version(id),
+                    create_random_string(16),
+                    expire=USER_CACHE_TTL * 2,
+                )
+            pipe.delete(keys.user_doc(id))
+        await self._cache.dispatch_action(USERS_CHANNEL, "INVALIDATE", {"id": id})
 
-    async def get_by_email(self, email: str) -> Optional[dict]:
-        return await self._database.get_by_email(email)
+    async def _get_shared(self, id: int) -> Optional[dict]:
+        if not USER_CACHE_TTL:
+            return await self._database.get(id)
 
-    async def get_by_username(self, username: str) -> Optional[dict]:
-        return await self._database.get_by_username(username)
+        # the version is read before the database so a concurrent write is seen
+        version, cached = await self._cache.mget(
+            keys.user_version(id), keys.user_doc(id)
+        )
+        if cached is not None:
+            cached_version, item = self._deserialize(cached)
+            if cached_version == version:
+                return item
+
+        item = await self._database.get(id)
+        if item is not None:
+            await self._cache.set(
+                keys.user_doc(id), self._serialize(item, version), expire=USER_CACHE_TTL
+            )
+        return item
+
+    @staticmethod
+    def _project(item: Optional[dict], fields: Optional[Fields]) -> Optional[dict]:
+        if item is None or fields is None:
+            return item
+        return {field: item[field] for field in fields if field in item}
+
+    async def get(self, id: int, fields: Optional[Fields] = None) -> Optional[dict]:
+        local = self._local_enabled
+        if local:
+            item = self._local_users.get(id)
+            if item is not None:
+                return self._project(copy.deepcopy(item), fields)
+
+        if fields is not None and not USER_CACHE_TTL and not local:
+            # nothing to fill, read only the fields asked for
+            return await self._database.get(id, fields)
+
+        if not local:
+            return self._project(await self._get_shared(id), fields)
+
+        read = self._local_reads.setdefault(id, [0, 0])
+        read[0] += 1
+        generation = read[1]
+        try:
+            item = await self._get_shared(id)
+        finally:
+            read[0] -= 1
+            if not read[0]:
+                del self._local_reads[id]
+        if item is not None and read[1] == generation:
+            self._remember(item)
+        return self._project(item, fields)
+
+    async def _get_by_field(
+        self,
+        field: str,
+        value: str,
+        fetch: Callable[[str, Optional[Fields]], Awaitable[Optional[dict]]],
+        fields: Optional[Fields],
+    ) -> Optional[dict]:
+        local = self._local_enabled
+        if local:
+            id = self._local_ids.get((field, value))
+            if id is not None:
+                item = await self.get(id, None if fields is None else (*fields, field))
+                # the mapping is stale after a rename or delete
+                if item is not None and item.get(field) == value:
+                    return self._project(item, fields)
+                self._local_ids.delete((field, value))
+
+        if not USER_CACHE_TTL and not local:
+            return await fetch(value, fields)
+
+        # resolve the id only, get fills the caches without racing writes
+        found = await fetch(value, ("id",))
+        if found is None:
+            return None
+        item = await self.get(
+            found.get("id"), None if fields is None else (*fields, field)
+        )
+        if item is None or item.get(field) != value:
+            # renamed or deleted in between
+            return await fetch(value, fields)
+        return self._project(item, fields)
+
+    async def get_by_email(
+        self, email: str, fields: Optional[Fields] = None
+    ) -> Optional[dict]:
+        return await self._get_by_field(
+            "email", email, self._database.get_by_email, fields
+        )
+
+    async def get_by_username(
+        self, username: str, fields: Optional[Fields] = None
+    ) -> Optional[dict]:
+        return await self._get_by_field(
+            "username", username, self._database.get_by_username, fields
+        )
 
     async def get_by_social(self, provider: str, sid: str) -> Optional[dict]:
         return await self._database.get_by_social(provider, str(sid))
 
-    async def get_by_login(self, login: str) -> Optional[dict]:
+    async def get_by_login(
+        self, login: str, fields: Optional[Fields] = None
+    ) -> Optional[dict]:
         try:
             valid_email = validate_email(login).email
-            return await self.get_by_email(valid_email)
+            return await self.get_by_email(valid_email, fields)
         except EmailNotValidError:
-            return await self.get_by_username(login)
+            return await self.get_by_username(login, fields)
 
     async def create(self, obj: dict) -> int:
-        return await self._database.create(obj)
+        return await self._database.create(self._with_search_fields(obj))
 
     async def update(self, id: int, obj: dict) -> None:
-        await self._database.update(id, obj)
+        await self._database.update(id, self._with_search_fields(obj))
+        await self._invalidate(id)
         return None
 
     async def delete(self, id: int) -> None:
         await self._database.delete(id)
+        await self._invalidate(id)
         return None
 
     async def update_last_login(self, id: int) -> None:
         await self.update(id, {"last_login": datetime.utcnow()})
 
-    async def search(
-        self, id: int, username: str, p: int, size: int
-    ) -> Tuple[dict, int]:
+    @staticmethod
+    def _search_filter(
+        id: Optional[int], username: Optional[str], match: str = "prefix"
+    ) -> dict:
         if id is not None:
-            f = {"id": id}
+            return {"id": id}
         elif username is not None and username.strip() != "":
-            f = {"username": re.compile(username, re.IGNORECASE)}  # type: ignore
+            # the input is escaped, admins search by text, not by pattern
+            q = re.escape(normalize_username(username))
+            pattern = q if match == "contains" else f"^{q}"
+            f: dict = {"username_lower": {"$regex": pattern}}
+
+            trigrams = get_trigrams(normalize_username(username))
+            if match == "contains" and USERNAME_TRIGRAMS and trigrams:
+                f = {
+                    "$or": [
+                        {"$and": [{"username_trigrams": {"$all": trigrams}}, f]},
+                        {"username_trigrams": {"$exists": False}, **f},
+                    ]
+                }
+
+            # users the backfill hasn't reached yet only have username
+            legacy = {
+                "username_lower": {"$exists": False},
+                "username": {"$regex": pattern, "$options": "i"},
+            }
+            return {"$or": [f, legacy]}
         else:
-            f = {}
-        return await self._database.search(f, p, size)
+            return {}
+
+    async def search(
+        self,
+        id: int,
+        username: str,
+        p: int,
+        size: int,
+        total: str = "exact",
+        match: str = "prefix",
+    ) -> Tuple[List[dict], Optional[int]]:
+        f = self._search_filter(id, username, match)
+        return await self._database.search(f, p, size, total)
+
+    async def search_after(
+        self,
+        id: Optional[int],
+        username: Optional[str],
+        after: Optional[int],
+        size: int,
+        total: str = "exact",
+        match: str = "prefix",
+    ) -> Tuple[List[dict], Optional[int]]:
+        f = self._search_filter(id, username, match)
+        return await self._database.search_after(f, after, size, total)
+
+    async def backfill_search_fields(self, batch_size: int = 1000) -> int:
+        missing = "username_trigrams" if USERNAME_TRIGRAMS else "username_lower"
+
+        def compute(item: dict) -> dict:
+            if item.get("username") is None:
+                return {}
+            return self._search_fields(item.get("username"))
+
+        return await self._database.backfill(
+            missing, ("username",), compute, batch_size
+        )
+
+
+# KEYS[1] - counter, ARGV[1] - max, ARGV[2] - timeout. Returns 1 if allowed.
+CHECK_TIMEOUT_AND_INCR = RedisScript("""
+local count = tonumber(redis.call("GET", KEYS[1]))
+if count == nil then
+    redis.call("SET", KEYS[1], 1, "EX", ARGV[2])
+    return 1
+end
+if count >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call("INCR", KEYS[1])
+return 1
+""")
+
+# KEYS[1] - timeout, KEYS[2] - rate, ARGV[1] - limit, ARGV[2] - window,
+# ARGV[3] - timeout. Returns 0 - allowed, 1 - in timeout, 2 - timeout just set.
+IS_BRUTEFORCE = RedisScript("""
+local ttl = redis.call("PTTL", KEYS[1])
+if ttl ~= -2 then
+    return {1, ttl}
+end
+local rate = redis.call("INCR", KEYS[2])
+if rate == 1 then
+    redis.call("EXPIRE", KEYS[2], ARGV[2])
+end
+if rate > tonumber(ARGV[1]) then
+    redis.call("SET", KEYS[1], 1, "EX", ARGV[3])
+    return {2, tonumber(ARGV[3]) * 1000}
+end
+return {0, 0}
+""")
 
 
 class UsersProtectionMixin(Base):
     async def _check_timeout_and_incr(self, key: str, max: int, timeout: int) -> bool:
-        count = await self._cache.get(key)
-        if count is not None:
-            count = int(count)  # type: ignore
-            if count >= max:  # type: ignore
-                return False
-            else:
-                await self._cache.incr(key)
-                return True
-        else:
-            await self._cache.set(key, 1, expire=timeout)
-            return True
+        allowed = await self._cache.run_script(
+            CHECK_TIMEOUT_AND_INCR, [key], [max, timeout]
+        )
+        return bool(allowed)
 
     async def is_bruteforce(self, ip: str, login: str) -> bool:
-        timeout_key = f"users:login:timeout:{ip}"
-        timeout = await self._cache.get(timeout_key)
-
-        if timeout is not None:
+        if self._login_prefilter.check(ip) is not None:
             return True
 
-        rate_key = f"users:login:rate:{ip}"
-        rate = await self._cache.get(rate_key)
-
-        if rate is not None:
-            rate = int(rate)  # type: ignore
-            if rate > LOGIN_RATELIMIT:  # type: ignore
-                await self._cache.set(timeout_key, 1, expire=60)
-                logger.info(f"bruteforce_login ip={ip} login={login}")
-                return True
-        else:
-            await self._cache.set(rate_key, 1, expire=60)
-
-        await self._cache.incr(rate_key)
-        return False
+        res, ttl = await self._cache.run_script(
+            IS_BRUTEFORCE,
+            [keys.login_timeout(ip), keys.login_rate(ip)],
+            [LOGIN_RATELIMIT, 60, 60],
+        )
+        if res == 2:
+            logger.info(f"bruteforce_login ip={ip} login={login}")
+        if res != 0:
+            self._login_prefilter.block(ip, ttl / 1000)
+        return res != 0
 
 
 class UsersConfirmMixin(Base):
     async def is_email_confirmation_available(self, id: int) -> bool:
-        key = f"users:confirm:count:{id}"
+        key = keys.user_confirm_count(id)
         return await self._check_timeout_and_incr(
             key, EMAIL_CONFIRMATION_MAX, EMAIL_CONFIRMATION_TIMEOUT
         )
@@ -126,7 +421,12 @@ class UsersConfirmMixin(Base):
         return None
 
     async def confirm_email(self, token_hash: str) -> bool:
-        return await self._database.confirm_email(token_hash)
+        id = await self._database.confirm_email(token_hash)
+        if id is None:
+            return False
+
+        await self._invalidate(id)
+        return True
 
 
 class UsersUsernameMixin(Base):
@@ -148,7 +448,7 @@ class UsersUsernameMixin(Base):
 
 class UsersPasswordMixin(Base):
     async def get_password_status(self, id: int) -> str:
-        item = await self.get(id)
+        item = await self.get(id, ("provider", "password"))
         if item.get("provider") is not None and item.get("password") is None:
             return "set"
         else:
@@ -158,17 +458,17 @@ class UsersPasswordMixin(Base):
         await self.update(id, {"password": password})
 
     async def is_password_reset_available(self, id: int) -> bool:
-        key = f"users:reset:count:{id}"
+        key = keys.user_reset_count(id)
         return await self._check_timeout_and_incr(
             key, PASSWORD_RESET_MAX, PASSWORD_RESET_TIMEOUT
         )  # type: ignore
 
     async def set_password_reset_token(self, id: int, token_hash: str) -> None:
-        key = f"users:reset:token:{token_hash}"
+        key = keys.reset_token(token_hash)
         await self._cache.set(key, id, expire=PASSWORD_RESET_LIFETIME)
 
     async def get_id_for_password_reset(self, token_hash: str) -> Optional[int]:
-        id = await self._cache.get(f"users:reset:token:{token_hash}")
+        id = await self._cache.get(keys.reset_token(token_hash))
         if id is not None:
             return int(id)
         else:
@@ -176,53 +476,144 @@ class UsersPasswordMixin(Base):
 
 
 class UsersManagementMixin(Base):
-    async def get_blacklist(self) -> dict:
-        blacklist_db = await self._database.get_blacklist()
-        blacklist_cache = await self._cache.keys("users:blacklist:*")
-        blacklist_cache_ids = []
-        for key in blacklist_cache:
-            _, _, id = key.split(":")
-            blacklist_cache_ids.append(id)
+    async def _dispatch_revocation(self, action: str, payload: dict) -> None:
+        await self._cache.dispatch_action(REVOCATION_CHANNEL, action, payload)
+
+    async def get_blacklist(self, after: Optional[int] = None, size: int = 100) -> dict:
+        """Bans stored in MongoDB one page at a time, plus the ones live in Redis.
+
+        Returns:
+            {"global": [{"id": 2, "username": "user"}], "next": 2, "current": ["2"]}
+            where "next" is the `after` of the following page, None on the last one.
+        """
+        items = await self._database.get_blacklist(after, size)
+        has_next = len(items) > size
+        blacklist_db = [
+            {"id": item.get("id"), "username": item.get("username")}
+            for item in items[:size]
+        ]
+
+        # members are scored by expiration, drop the expired ones on read
+        now = int(time.time())
+        async with self._cache.pipeline() as pipe:
+            pipe.zremrangebyscore(keys.BLACKLIST, float("-inf"), now)
+            blacklist_cache_ids = pipe.zrangebyscore(keys.BLACKLIST, now, float("inf"))
         return {
-            "global": [
-                {"id": item.get("id"), "username": item.get("username")}
-                for item in blacklist_db
-            ],
-            "current": blacklist_cache_ids,
+            "global": blacklist_db,
+            "next": blacklist_db[-1].get("id") if has_next else None,
+            "current": list(blacklist_cache_ids.result()),
         }
 
     async def toggle_blacklist(self, id: int) -> None:
-        item = await self.get(id)  # type: ignore
+        item = await self.get(id, ("active",))  # type: ignore
         active = item.get("active")
         await self.update(id, {"active": not active})
-        key = f"users:blacklist:{id}"
+        key = keys.user_blacklist(id)
         if active:
-            await self._cache.set(key, 1, expire=self._access_expiration)
+            async with self._cache.pipeline() as pipe:
+                pipe.set(key, 1, expire=self._access_expiration)
+                pipe.zadd(
+                    keys.BLACKLIST, int(time.time()) + self._access_expiration, id
+                )
+            await self._dispatch_revocation("BLACKLIST_ADD", {"id": id})
         else:
-            await self._cache.delete(key)
+            async with self._cache.pipeline() as pipe:
+                pipe.delete(key)
+                pipe.zrem(keys.BLACKLIST, id)
+            await self._dispatch_revocation("BLACKLIST_REMOVE", {"id": id})
         return None
 
     async def kick(self, id: int) -> None:
-        key = f"users:kick:{id}"
-        now = int(datetime.utcnow().timestamp())
-
-        await self._cache.set(key, now, expire=self._access_expiration)
+        now = int(time.time())
+
+        async with self._cache.pipeline() as pipe:
+            pipe.set(keys.user_kick(id), now, expire=self._access_expiration)
+            pipe.zadd(keys.KICKS, now, id)
+            pipe.zremrangebyscore(
+                keys.KICKS, float("-inf"), now - self._access_expiration
+            )
+        await self._dispatch_revocation("KICK", {"id": id, "ts": now})
+
+    async def _move_legacy_keys(self, batch: List[str], move: Callable) -> int:
+        async with self._cache.pipeline(transaction=False) as pipe:
+            reads = [(key, pipe.get(key), pipe.pttl(key)) for key in batch]
+
+        moved = 0
+        async with self._cache.pipeline(transaction=False) as pipe:
+            for key, value, ttl in reads:
+                if value.result() is None:
+                    continue
+                ms = ttl.result()
+                expire = math.ceil(ms / 1000) if ms > 0 else self._access_expiration
+                move(pipe, int(key.split(":")[-1]), value.result(), expire)
+                pipe.delete(key)
+                moved += 1
+        return moved
+
+    async def _migrate_legacy_keys(
+        self, pattern: str, move: Callable, batch_size: int = 500
+    ) -> int:
+        migrated = 0
+        batch: List[str] = []
+        async for key in self._cache.scan(pattern):
+            batch.append(key)
+            if len(batch) >= batch_size:
+                migrated += await self._move_legacy_keys(batch, move)
+                batch = []
+        if batch:
+            migrated += await self._move_legacy_keys(batch, move)
+        return migrated
+
+    async def migrate_revocation_keys(self) -> int:
+        """Moves bans and kicks stored under the flat pre-hash-tag key names.
+
+        They live at most one access token lifetime, so this is run once
+        right after upgrading. Returns the number of keys moved.
+        """
+
+        def move_ban(pipe: Any, id: int, value: str, expire: int) -> None:
+            pipe.set(keys.user_blacklist(id), value, expire=expire)
+            pipe.zadd(keys.BLACKLIST, int(time.time()) + expire, id)
+
+        def move_kick(pipe: Any, id: int, value: str, expire: int) -> None:
+            pipe.set(keys.user_kick(id), value, expire=expire)
+            pipe.zadd(keys.KICKS, int(value), id)
+
+        migrated = await self._migrate_legacy_keys(
+            keys.LEGACY_BLACKLIST_PATTERN, move_ban
+        )
+        migrated += await self._migrate_legacy_keys(keys.LEGACY_KICK_PATTERN, move_kick)
+        if migrated:
+            logger.info(f"migrate_revocation_keys migrated={migrated}")
+        return migrated
 
     async def get_blackout(self) -> Optional[str]:
-        return await self._cache.get("users:blackout")
+        return await self._cache.get(keys.BLACKOUT)
 
     async def set_blackout(self, ts: int) -> None:
-        await self._cache.set("users:blackout", ts)
+        await self._cache.set(keys.BLACKOUT, ts)
+        await self._dispatch_revocation("BLACKOUT_SET", {"ts": ts})
 
     async def delete_blackout(self) -> None:
-        await self._cache.delete("users:blackout")
+        await self._cache.delete(keys.BLACKOUT)
+        await self._dispatch_revocation("BLACKOUT_DELETE", {})
 
     async def set_permissions(self) -> None:
         pass
 
 
+class UsersImportMixin(Base):
+    async def create_many(self, objs: List[dict]) -> List[Tuple[int, str]]:
+        ids = await self._database.allocate_ids(len(objs))
+        for obj, id in zip(objs, ids):
+            obj.update({"id": id})
+            self._with_search_fields(obj)
+        return await self._database.insert_many(objs)
+
+
 class UsersRepo(
     UsersCRUDMixin,
+    UsersImportMixin,
     UsersConfirmMixin,
     UsersPasswordMixin,
     UsersUsernameMixin,
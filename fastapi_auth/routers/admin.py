@@ -1,6 +1,6 @@
-from typing import Callable
+from typing import Callable, Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 
 from fastapi_auth.repositories import UsersRepo
 from fastapi_auth.services import AdminService
@@ -18,9 +18,11 @@ def get_router(
     @router.get(
         "/blacklist", name="admin:get_blacklist", dependencies=[Depends(admin_required)]
     )
-    async def get_blacklist():
+    async def get_blacklist(
+        *, after: Optional[int] = None, size: int = Query(100, ge=1, le=1000)
+    ):
         service = AdminService()
-        return await service.get_blacklist()
+        return await service.get_blacklist(after, size)
 
     @router.post(
         "/{id}/blacklist",
@@ -80,4 +82,13 @@ def get_router(
         service = AdminService()
         return await service.kick(id)
 
+    @router.get(
+        "/stats/password_hash",
+        name="admin:get_password_hash_stats",
+        dependencies=[Depends(admin_required)],
+    )
+    async def get_password_hash_stats():
+        service = AdminService()
+        return await service.get_password_hash_stats()
+
     return router
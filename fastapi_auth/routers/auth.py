@@ -1,9 +1,10 @@
-from typing import Callable, Dict
+from typing import Callable, Dict, List, Optional
 
 from fastapi import APIRouter, Body, Depends, Request, Response
 from fastapi.exceptions import HTTPException
 
 from fastapi_auth.core.jwt import JWTBackend
+from fastapi_auth.core.ratelimit import get_client_ip, get_rate_limit_dependencies
 from fastapi_auth.core.user import User
 from fastapi_auth.repositories import UsersRepo
 from fastapi_auth.services import AuthService
@@ -38,6 +39,7 @@ def get_router(
     smtp_host: str,
     smtp_tls: int,
     display_name: str,
+    rate_limits: Optional[Dict[str, Callable]] = None,
 ) -> APIRouter:
 
     AuthService.setup(
@@ -81,7 +83,12 @@ def get_router(
 
     router = APIRouter()
 
-    @router.post("/register", name="auth:register")
+    def limits(name: str) -> List:
+        return get_rate_limit_dependencies(rate_limits, name)
+
+    @router.post(
+        "/register", name="auth:register", dependencies=limits("auth:register")
+    )
     async def register(*, request: Request, response: Response):
         data = await request.json()
         service = AuthService()
@@ -90,28 +97,32 @@ def get_router(
         set_tokens_in_response(response, tokens)
         return None
 
-    @router.post("/login", name="auth:login")
+    @router.post("/login", name="auth:login", dependencies=limits("auth:login"))
     async def login(*, request: Request, response: Response):
         data = await request.json()
         service = AuthService()
 
-        ip = request.client.host
+        ip = get_client_ip(request)
 
         tokens = await service.login(data, ip)
         set_tokens_in_response(response, tokens)
         return None
 
-    @router.post("/logout", name="auth:logout")
+    @router.post("/logout", name="auth:logout", dependencies=limits("auth:logout"))
     async def logout(*, response: Response):
         response.delete_cookie(access_cookie_name)
         response.delete_cookie(refresh_cookie_name)
         return None
 
-    @router.post("/token", name="auth:token")
+    @router.post("/token", name="auth:token", dependencies=limits("auth:token"))
     async def token(*, user: User = Depends(get_authenticated_user)):
         return user.data
 
-    @router.post("/token/refresh", name="auth:refresh_access_token")
+    @router.post(
+        "/token/refresh",
+        name="auth:refresh_access_token",
+        dependencies=limits("auth:refresh_access_token"),
+    )
     async def refresh_access_token(
         *,
         request: Request,
@@ -126,26 +137,42 @@ def get_router(
         set_access_token_in_response(response, access_token)
         return {"access": access_token}
 
-    @router.get("/confirm", name="auth:get_email_confirmation_status")
+    @router.get(
+        "/confirm",
+        name="auth:get_email_confirmation_status",
+        dependencies=limits("auth:get_email_confirmation_status"),
+    )
     async def get_email_confirmation_status(
         *, user: User = Depends(get_authenticated_user)
     ):
         service = AuthService(user)
         return await service.get_email_confirmation_status()
 
-    @router.post("/confirm", name="auth:request_email_confirmation")
+    @router.post(
+        "/confirm",
+        name="auth:request_email_confirmation",
+        dependencies=limits("auth:request_email_confirmation"),
+    )
     async def request_email_confirmation(
         *, user: User = Depends(get_authenticated_user)
     ):
         service = AuthService(user)
         return await service.request_email_confirmation()
 
-    @router.post("/confirm/{token}", name="auth:confirm_email")
+    @router.post(
+        "/confirm/{token}",
+        name="auth:confirm_email",
+        dependencies=limits("auth:confirm_email"),
+    )
     async def confirm_email(*, token: str):
         service = AuthService()
         return await service.confirm_email(token)
 
-    @router.post("/{id}/change_username", name="auth:change_username")
+    @router.post(
+        "/{id}/change_username",
+        name="auth:change_username",
+        dependencies=limits("auth:change_username"),
+    )
     async def change_username(
         *,
         id: int,
@@ -1,8 +1,9 @@
-from typing import Callable
+from typing import Callable, Dict, List, Optional
 
 from fastapi import APIRouter, Depends, Request
 
 from fastapi_auth.core.jwt import JWTBackend
+from fastapi_auth.core.ratelimit import get_client_ip, get_rate_limit_dependencies
 from fastapi_auth.core.user import User
 from fastapi_auth.repositories import UsersRepo
 from fastapi_auth.services import PasswordService
@@ -22,6 +23,7 @@ def get_router(
     smtp_host: str,
     smtp_tls: int,
     display_name: str,
+    rate_limits: Optional[Dict[str, Callable]] = None,
 ):
 
     PasswordService.setup(
@@ -41,19 +43,32 @@ def get_router(
 
     router = APIRouter()
 
-    @router.post("/forgot_password", name="auth:forgot_password")
+    def limits(name: str) -> List:
+        return get_rate_limit_dependencies(rate_limits, name)
+
+    @router.post(
+        "/forgot_password",
+        name="auth:forgot_password",
+        dependencies=limits("auth:forgot_password"),
+    )
     async def forgot_password(*, request: Request):
         data = await request.json()
-        ip = request.client.host
+        ip = get_client_ip(request)
         service = PasswordService()
         return await service.forgot_password(data, ip)
 
-    @router.get("/password", name="auth:password_status")
+    @router.get(
+        "/password",
+        name="auth:password_status",
+        dependencies=limits("auth:password_status"),
+    )
     async def password_status(*, user: User = Depends(get_authenticated_user)):
         service = PasswordService(user)
         return await service.password_status()
 
-    @router.post("/password", name="auth:password_set")
+    @router.post(
+        "/password", name="auth:password_set", dependencies=limits("auth:password_set")
+    )
     async def password_set(
         *, request: Request, user: User = Depends(get_authenticated_user)
     ):
@@ -61,13 +76,21 @@ def get_router(
         service = PasswordService(user)
         return await service.password_set(data)
 
-    @router.post("/password/{token}", name="auth:password_reset")
+    @router.post(
+        "/password/{token}",
+        name="auth:password_reset",
+        dependencies=limits("auth:password_reset"),
+    )
     async def password_reset(*, token: str, request: Request):
         data = await request.json()
         service = PasswordService()
         return await service.password_reset(data, token)
 
-    @router.put("/password", name="auth:password_change")
+    @router.put(
+        "/password",
+        name="auth:password_change",
+        dependencies=limits("auth:password_change"),
+    )
     async def password_change(
         *, request: Request, user: User = Depends(get_authenticated_user)
     ):
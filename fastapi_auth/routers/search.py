@@ -1,6 +1,6 @@
 from typing import Callable, Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 
 from fastapi_auth.repositories import UsersRepo
 from fastapi_auth.services import SearchService
@@ -19,9 +19,15 @@ def get_router(repo: UsersRepo, admin_required: Callable):
 
     @router.get("", name="auth:search", dependencies=[Depends(admin_required)])
     async def search(
-        *, id: Optional[int] = None, username: Optional[str] = None, p: int = 1
+        *,
+        id: Optional[int] = None,
+        username: Optional[str] = None,
+        p: int = 1,
+        cursor: Optional[str] = None,
+        total: str = Query("exact", regex="^(exact|estimate|none)$"),
+        match: str = Query("prefix", regex="^(prefix|contains)$"),
     ):
         service = SearchService()
-        return await service.search(id, username, p)
+        return await service.search(id, username, p, cursor, total, match)
 
     return router
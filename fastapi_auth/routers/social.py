@@ -1,11 +1,12 @@
 import hashlib
 import os
-from typing import Iterable, Optional
+from typing import Callable, Dict, Iterable, List, Optional
 
 from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
 
 from fastapi_auth.core.jwt import JWTBackend
+from fastapi_auth.core.ratelimit import get_rate_limit_dependencies
 from fastapi_auth.exceptions.social import SocialException
 from fastapi_auth.repositories import UsersRepo
 from fastapi_auth.services import SocialService
@@ -27,17 +28,21 @@ def get_router(
     refresh_expiration: int,
     social_providers: Iterable[str],
     social_creds: Optional[dict],
+    rate_limits: Optional[Dict[str, Callable]] = None,
 ):
 
     SocialService.setup(repo, auth_backend, language, base_url, social_creds)
 
     router = APIRouter()
 
+    def limits(name: str) -> List:
+        return get_rate_limit_dependencies(rate_limits, name)
+
     def check_provider(provider):
         if provider not in social_providers:
             raise HTTPException(404)
 
-    @router.get("/{provider}", name="social:login")
+    @router.get("/{provider}", name="social:login", dependencies=limits("social:login"))
     async def login(*, provider: str, request: Request):
         check_provider(provider)
         service = SocialService()
@@ -49,7 +54,11 @@ def get_router(
         redirect_uri = method(state)
         return RedirectResponse(redirect_uri)
 
-    @router.get("/{provider}/callback", name="social:callback")
+    @router.get(
+        "/{provider}/callback",
+        name="social:callback",
+        dependencies=limits("social:callback"),
+    )
     async def callback(*, provider: str, request: Request):
         check_provider(provider)
 
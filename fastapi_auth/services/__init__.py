@@ -3,3 +3,4 @@ from .auth import AuthService
 from .password import PasswordService
 from .search import SearchService
 from .social import SocialService
+from .users_import import ImportService
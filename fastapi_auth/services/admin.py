@@ -3,6 +3,7 @@ from typing import Optional
 
 from fastapi import HTTPException
 
+from fastapi_auth.core.password import password_hash_limiter
 from fastapi_auth.repositories.users import UsersRepo
 
 
@@ -13,8 +14,8 @@ class AdminService:
     def setup(cls, repo: UsersRepo) -> None:
         cls._repo = repo
 
-    async def get_blacklist(self) -> dict:
-        return await self._repo.get_blacklist()
+    async def get_blacklist(self, after: Optional[int], size: int) -> dict:
+        return await self._repo.get_blacklist(after, size)
 
     async def toggle_blacklist(self, id: int) -> None:
         return await self._repo.toggle_blacklist(id)
@@ -37,7 +38,7 @@ class AdminService:
         await self._repo.delete_blackout()
 
     async def get_id_by_username(self, username: str) -> Optional[dict]:
-        item = await self._repo.get_by_username(username)
+        item = await self._repo.get_by_username(username, ("id",))
         return {"id": item.get("id")}
 
     async def get_permissions(self, id: int) -> dict:
@@ -47,7 +48,7 @@ class AdminService:
         action = data.get("action")
         payload = data.get("payload")
 
-        item = await self._repo.get(id)
+        item = await self._repo.get(id, ("permissions",))
         permissions = item.get("permissions")
 
         if action == "ADD":
@@ -69,3 +70,6 @@ class AdminService:
 
     async def kick(self, id: int) -> None:
         await self._repo.kick(id)
+
+    async def get_password_hash_stats(self) -> dict:
+        return password_hash_limiter.stats()
@@ -1,6 +1,6 @@
 import asyncio
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Coroutine, Dict, Optional, Set
 
 from email_validator import EmailNotValidError, validate_email
 from fastapi import HTTPException
@@ -9,7 +9,11 @@ from pydantic.error_wrappers import ValidationError
 from fastapi_auth.core.email import EmailClient
 from fastapi_auth.core.jwt import JWTBackend
 from fastapi_auth.core.logger import logger
-from fastapi_auth.core.password import get_password_hash, verify_password
+from fastapi_auth.core.password import (
+    get_password_hash_async,
+    password_needs_update,
+    verify_password_async,
+)
 from fastapi_auth.core.user import User
 from fastapi_auth.models.user import (
     UserInChangeUsername,
@@ -23,6 +27,9 @@ from fastapi_auth.resources.error_messages import get_error_message
 from fastapi_auth.utils.captcha import validate_captcha
 from fastapi_auth.utils.strings import create_random_string, hash_string
 
+PAYLOAD_FIELDS = (*UserPayload.__fields__, "active")
+LOGIN_FIELDS = (*PAYLOAD_FIELDS, "password")
+
 
 class AuthService:
     _repo: UsersRepo
@@ -37,6 +44,8 @@ class AuthService:
     _smtp_host: str
     _smtp_tls: int
     _display_name: str
+    # fire-and-forget work, referenced until done so it isn't collected
+    _background_tasks: Set[asyncio.Task] = set()
 
     def __init__(self, user: Optional[User] = None) -> None:
         self._user = user
@@ -70,6 +79,18 @@ class AuthService:
         cls._site = site
         cls._display_name = display_name
 
+    @classmethod
+    def _run_in_background(cls, coro: Coroutine) -> None:
+        task = asyncio.create_task(coro)
+        cls._background_tasks.add(task)
+        task.add_done_callback(cls._background_task_done)
+
+    @classmethod
+    def _background_task_done(cls, task: asyncio.Task) -> None:
+        cls._background_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.info(f"background_task error={task.exception()!r}")
+
     def _validate_user_model(self, model, data: dict):
         try:
             user = model(**data)
@@ -80,10 +101,10 @@ class AuthService:
             raise HTTPException(400, detail=get_error_message(msg, self._language))
 
     async def _email_exists(self, email: str) -> bool:
-        return await self._repo.get_by_email(email) is not None
+        return await self._repo.get_by_email(email, ("id",)) is not None
 
     async def _username_exists(self, username: str) -> bool:
-        return await self._repo.get_by_username(username) is not None
+        return await self._repo.get_by_username(username, ("id",)) is not None
 
     def _create_email_client(self) -> EmailClient:
         return EmailClient(
@@ -116,6 +137,7 @@ class AuthService:
         Raises:
             HTTPException:
                 400 - validation error.
+                503 - password hashing overloaded.
 
         """
         if not self._debug:
@@ -143,7 +165,7 @@ class AuthService:
             )
 
         new_user = UserInCreate(
-            **user.dict(), password=get_password_hash(user.password1)
+            **user.dict(), password=await get_password_hash_async(user.password1)
         ).dict()
 
         try:
@@ -155,7 +177,7 @@ class AuthService:
 
         new_user_id = await self._repo.create(new_user)
 
-        asyncio.create_task(self._request_email_confirmation(new_user.get("email")))
+        self._run_in_background(self._request_email_confirmation(new_user.get("email")))
 
         payload = UserPayload(id=new_user_id, username=user.username).dict()
         return self._auth_backend.create_tokens(payload)
@@ -166,6 +188,14 @@ class AuthService:
     async def _update_last_login(self, id: int) -> None:
         await self._repo.update(id, {"last_login": datetime.utcnow()})
 
+    async def _rehash_password(self, id: int, password: str) -> None:
+        try:
+            password_hash = await get_password_hash_async(password)
+            await self._repo.set_password(id, password_hash)
+            logger.info(f"rehash_password id={id} success")
+        except Exception as e:
+            logger.info(f"rehash_password id={id} error={e!r}")
+
     async def login(self, data: dict, ip: str) -> Dict[str, str]:
         """POST /login
 
@@ -181,6 +211,7 @@ class AuthService:
                 400 - validation error or ban.
                 404 - user doesn't exist.
                 429 - bruteforce attempt.
+                503 - password hashing overloaded.
         """
         try:
             user = UserInLogin(**data)
@@ -190,7 +221,7 @@ class AuthService:
         if await self._is_bruteforce(ip, user.login):
             raise HTTPException(429, detail="Too many requests")
 
-        item = await self._repo.get_by_login(user.login)
+        item = await self._repo.get_by_login(user.login, LOGIN_FIELDS)
 
         if item is None:
             raise HTTPException(404)
@@ -198,9 +229,14 @@ class AuthService:
         if not item.get("active"):
             raise HTTPException(400, detail=get_error_message("ban", self._language))
 
-        if not verify_password(user.password, item.get("password")):
+        if not await verify_password_async(user.password, item.get("password")):
             raise HTTPException(401)
 
+        if password_needs_update(item.get("password")):
+            self._run_in_background(
+                self._rehash_password(item.get("id"), user.password)
+            )
+
         await self._update_last_login(item.get("id"))
 
         payload = UserPayload(**item).dict()
@@ -231,7 +267,7 @@ class AuthService:
         ):
             raise HTTPException(401)
 
-        item = await self._repo.get(refresh_token_payload.get("id"))
+        item = await self._repo.get(refresh_token_payload.get("id"), PAYLOAD_FIELDS)
         if item is None or not item.get("active"):
             raise HTTPException(401)
 
@@ -245,7 +281,7 @@ class AuthService:
             Email as str and status as bool in a dict.
             Example: {"email": sample@sample.com, "confirmed": True}
         """
-        item = await self._repo.get(self._user.id)
+        item = await self._repo.get(self._user.id, ("email", "confirmed"))
 
         return {"email": item.get("email"), "confirmed": item.get("confirmed")}
 
@@ -262,7 +298,7 @@ class AuthService:
                 400 - confirmed is already True.
                 429 - timeout.
         """
-        item = await self._repo.get(self._user.id)
+        item = await self._repo.get(self._user.id, ("email", "confirmed"))
         if item.get("confirmed"):
             raise HTTPException(400)
 
@@ -297,14 +333,14 @@ class AuthService:
             UserInChangeUsername, {"username": username}
         ).username
 
-        item = await self._repo.get(id)
+        item = await self._repo.get(id, ("username",))
         old_username = item.get("username")
         if old_username == new_username:
             raise HTTPException(
                 400, detail=get_error_message("username change same", self._language)
             )
 
-        existing_user = await self._repo.get_by_username(new_username)
+        existing_user = await self._repo.get_by_username(new_username, ("id",))
 
         if existing_user is not None:
             raise HTTPException(
@@ -6,7 +6,7 @@ from pydantic import ValidationError
 from fastapi_auth.core.email import EmailClient
 from fastapi_auth.core.jwt import JWTBackend
 from fastapi_auth.core.logger import logger
-from fastapi_auth.core.password import get_password_hash, verify_password
+from fastapi_auth.core.password import get_password_hash_async, verify_password_async
 from fastapi_auth.core.user import User
 from fastapi_auth.models.user import (
     UserInChangePassword,
@@ -109,7 +109,7 @@ class PasswordService:
                 400, detail=get_error_message("validation", self._language)
             )
 
-        item = await self._repo.get_by_email(email)
+        item = await self._repo.get_by_email(email, ("id", "password"))
 
         if item is None:
             raise HTTPException(
@@ -143,10 +143,10 @@ class PasswordService:
         return {"status": status}
 
     async def password_set(self, data: dict) -> None:
-        item = await self._repo.get(self._user.id)
+        item = await self._repo.get(self._user.id, ("provider", "password"))
         if item.get("provider") is not None and item.get("password") is None:
             user_model = self._validate_user_model(UserInSetPassword, data)
-            password_hash = get_password_hash(user_model.password1)
+            password_hash = await get_password_hash_async(user_model.password1)
             await self._repo.set_password(self._user.id, password_hash)
             return None
         else:
@@ -163,20 +163,22 @@ class PasswordService:
 
         user_model = self._validate_user_model(UserInSetPassword, data)
 
-        password_hash = get_password_hash(user_model.password1)
+        password_hash = await get_password_hash_async(user_model.password1)
         await self._repo.set_password(id, password_hash)
 
         return None
 
     async def password_change(self, data: dict) -> None:
         user_model = self._validate_user_model(UserInChangePassword, data)
-        item = await self._repo.get(self._user.id)
+        item = await self._repo.get(self._user.id, ("password",))
 
-        if not verify_password(user_model.old_password, item.get("password")):
+        if not await verify_password_async(
+            user_model.old_password, item.get("password")
+        ):
             raise HTTPException(
                 400, detail=get_error_message("password invalid", self._language)
             )
 
-        password_hash = get_password_hash(user_model.password1)
+        password_hash = await get_password_hash_async(user_model.password1)
         await self._repo.set_password(self._user.id, password_hash)
         return None
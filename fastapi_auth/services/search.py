@@ -1,3 +1,5 @@
+import base64
+import binascii
 from typing import Optional
 
 from fastapi import HTTPException
@@ -20,11 +22,65 @@ class SearchService:
 
         return UserPrivateInfo(**item).dict(by_alias=True)
 
-    async def search(self, id: Optional[int], username: Optional[str], p: int) -> dict:
+    @staticmethod
+    def _encode_cursor(id: int) -> str:
+        return base64.urlsafe_b64encode(str(id).encode()).decode()
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> Optional[int]:
+        if cursor == "":
+            return None
+        try:
+            return int(base64.urlsafe_b64decode(cursor.encode()).decode())
+        except (ValueError, UnicodeDecodeError, binascii.Error):
+            raise HTTPException(400, detail="invalid cursor")
+
+    async def search(
+        self,
+        id: Optional[int],
+        username: Optional[str],
+        p: int,
+        cursor: Optional[str] = None,
+        total: str = "exact",
+        match: str = "prefix",
+    ) -> dict:
+        """GET /
+
+        Args:
+            p: page number, ignored when cursor is set.
+            cursor: "" for the first page, then "next" of the previous
+                response. Seeks on id instead of skipping, so every page costs
+                the same.
+            total: "exact", "estimate" or "none".
+            match: "prefix" or "contains", usernames are matched case-insensitively.
+
+        Returns:
+            Page mode: {"items": [...], "pages": 3, "currentPage": 1}
+            Cursor mode: {"items": [...], "next": "MjA=", "total": 42}
+        """
         PAGE_SIZE = 20
-        items, count = await self._repo.search(id, username, p, PAGE_SIZE)
-        div = count // PAGE_SIZE
-        pages = div if count % PAGE_SIZE == 0 else div + 1
+        if cursor is not None:
+            after = self._decode_cursor(cursor)
+            items, count = await self._repo.search_after(
+                id, username, after, PAGE_SIZE, total, match
+            )
+            has_next = len(items) > PAGE_SIZE
+            items = items[:PAGE_SIZE]
+            return {
+                "items": [
+                    UserPrivateInfo(**item).dict(by_alias=True, exclude_none=True)
+                    for item in items
+                ],
+                "next": self._encode_cursor(items[-1].get("id")) if has_next else None,
+                "total": count,
+            }
+
+        items, count = await self._repo.search(id, username, p, PAGE_SIZE, total, match)
+        if count is not None:
+            div = count // PAGE_SIZE
+            pages = div if count % PAGE_SIZE == 0 else div + 1
+        else:
+            pages = None
         return {
             "items": [
                 UserPrivateInfo(**item).dict(by_alias=True, exclude_none=True)
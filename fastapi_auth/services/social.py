@@ -137,7 +137,7 @@ class SocialService:
             if not item.get("active"):
                 raise SocialException("ban", 401)
         else:
-            existing_email = await self._repo.get_by_email(email)
+            existing_email = await self._repo.get_by_email(email, ("id",))
             if existing_email is not None:
                 raise SocialException("email exists", 401)
 
@@ -147,7 +147,9 @@ class SocialService:
             while True:
                 postfix = str(i) if i > 0 else ""
                 resolved_username = f"{username}{postfix}"
-                existing_username = await self._repo.get_by_username(resolved_username)
+                existing_username = await self._repo.get_by_username(
+                    resolved_username, ("id",)
+                )
                 if not existing_username:
                     break
 
@@ -0,0 +1,112 @@
+import asyncio
+from typing import Any, AsyncIterable, Callable, List, Optional
+
+from pydantic import ValidationError
+from pydantic.datetime_parse import parse_datetime
+
+from fastapi_auth.core.config import IMPORT_BATCH_SIZE
+from fastapi_auth.core.logger import logger
+from fastapi_auth.core.password import is_password_hash
+from fastapi_auth.models.social import SocialInCreate
+from fastapi_auth.models.user import UserInCreate
+from fastapi_auth.repositories.users import UsersRepo
+
+
+class ImportService:
+    _repo: UsersRepo
+
+    @classmethod
+    def setup(cls, repo: UsersRepo) -> None:
+        cls._repo = repo
+
+    @staticmethod
+    def _validate(record: dict) -> dict:
+        password = record.get("password")
+        if password is not None and not is_password_hash(password):
+            raise ValueError("password is not a supported hash")
+
+        if record.get("provider") is not None:
+            item = SocialInCreate(**record).dict()
+            if password is not None:
+                item.update({"password": password})
+        else:
+            item = UserInCreate(**record).dict()
+
+        # the models stamp the current time, keep the legacy dates instead
+        created_at = record.get("created_at")
+        if created_at is not None:
+            item.update({"created_at": parse_datetime(created_at)})
+            item.update({"last_login": item.get("created_at")})
+        last_login = record.get("last_login")
+        if last_login is not None:
+            item.update({"last_login": parse_datetime(last_login)})
+
+        return item
+
+    @staticmethod
+    def _error_message(e: Exception) -> str:
+        if isinstance(e, ValidationError):
+            error = e.errors()[0]
+            field = ".".join(str(loc) for loc in error.get("loc"))
+            return f"{field}: {error.get('msg')}"
+        return str(e)
+
+    async def _write(
+        self,
+        items: List[dict],
+        rows: List[int],
+        report: dict,
+        progress: Optional[Callable[[dict], Any]],
+    ) -> None:
+        errors = await self._repo.create_many(items)
+        for index, message in errors:
+            report["errors"].append({"row": rows[index], "error": message})
+        report["inserted"] += len(items) - len(errors)
+
+        if progress is not None:
+            if asyncio.iscoroutinefunction(progress):
+                await progress(report)
+            else:
+                progress(report)
+
+    async def import_users(
+        self,
+        records: AsyncIterable[dict],
+        batch_size: int = IMPORT_BATCH_SIZE,
+        progress: Optional[Callable[[dict], Any]] = None,
+    ) -> dict:
+        """Imports users with their existing password hashes.
+
+        Args:
+            records: user documents, social ones carry provider and sid.
+            batch_size: documents per unordered insert_many.
+            progress: called with the report after every written batch.
+
+        Returns:
+            Report with processed and inserted counts and per-row errors.
+            Example: {"processed": 3, "inserted": 2, "errors": [{"row": 1, "error": "..."}]}
+        """
+        report: dict = {"processed": 0, "inserted": 0, "errors": []}
+        items: List[dict] = []
+        rows: List[int] = []
+
+        async for record in records:
+            row = report["processed"]
+            report["processed"] += 1
+            try:
+                items.append(self._validate(record))
+                rows.append(row)
+            except (ValidationError, ValueError, TypeError) as e:
+                report["errors"].append({"row": row, "error": self._error_message(e)})
+
+            if len(items) >= batch_size:
+                await self._write(items, rows, report, progress)
+                items, rows = [], []
+
+        if items:
+            await self._write(items, rows, report, progress)
+
+        logger.info(
+            f"import_users processed={report['processed']} inserted={report['inserted']} errors={len(report['errors'])}"
+        )
+        return report
@@ -1,5 +1,6 @@
 import hashlib
 import hmac
+from typing import List
 
 from passlib.pwd import genword
 
@@ -18,3 +19,11 @@ def hash_string(s: str) -> str:
 
 def check_signature(s: str, signature: str, key: str) -> bool:
     return signature == hmac.new(key.encode(), s.encode(), hashlib.sha256).hexdigest()
+
+
+def normalize_username(username: str) -> str:
+    return username.strip().lower()
+
+
+def get_trigrams(s: str) -> List[str]:
+    return sorted({"".join(chars) for chars in zip(s, s[1:], s[2:])})
@@ -1,10 +1,32 @@
 import asyncio
+import os
 
+import aioredis
 import pytest
 
+from fastapi_auth.db.backend import RedisBackend
+
+# Lua scripts only run on a real server, e.g. REDIS_URL=redis://localhost:6379/15.
+# The database is flushed before and after every test that uses it.
+REDIS_URL = os.environ.get("REDIS_URL")
+
 
 @pytest.fixture
 def event_loop():
     loop = asyncio.get_event_loop()
     yield loop
     loop.close()
+
+
+@pytest.fixture
+async def redis_cache():
+    if REDIS_URL is None:
+        pytest.skip("REDIS_URL is not set")
+    client = await aioredis.create_redis(REDIS_URL, encoding="utf-8")
+    await client.flushdb()
+    backend = RedisBackend()
+    backend.set_client(client)
+    yield backend
+    await client.flushdb()
+    client.close()
+    await client.wait_closed()
@@ -1,10 +1,13 @@
+import time
 from datetime import datetime
+from unittest import mock
 
+import jwt
 import pytest
 
 from fastapi_auth.core.jwt import JWTBackend
 
-from .utils import MockCacheBackend, private_key, public_key
+from .utils import MockCacheBackend, generate_keys, private_key, public_key
 
 jwt_backend = JWTBackend(MockCacheBackend(), private_key, public_key, 60, 60 * 10)
 
@@ -79,10 +82,135 @@ async def test_blackout():
 
 @pytest.mark.asyncio
 async def test_logout():
-    key = "users:kick:1"
+    key = "users:{1}:kick"
     epoch = datetime.utcfromtimestamp(0)
     ts = int((datetime.utcnow() - epoch).total_seconds()) + 10
     await jwt_backend._cache.set(key, ts, 10)
     payload = await jwt_backend.decode_token(sample_access_token)
     assert payload is None
     await jwt_backend._cache.delete(key)
+
+
+@pytest.mark.asyncio
+async def test_token_cache():
+    token = jwt_backend.create_access_token({"id": 3})
+    payload = await jwt_backend.decode_token(token)
+    assert payload is not None
+
+    with mock.patch("fastapi_auth.core.jwt.jwt_api.decode") as mock_decode:
+        cached_payload = await jwt_backend.decode_token(token)
+        mock_decode.assert_not_called()
+
+    assert cached_payload == payload
+
+
+@pytest.mark.asyncio
+async def test_token_cache_revocation():
+    token = jwt_backend.create_access_token({"id": 3})
+    assert await jwt_backend.decode_token(token) is not None
+
+    key = "users:{3}:blacklist"
+    await jwt_backend._cache.set(key, 1, 10)
+    payload = await jwt_backend.decode_token(token)
+    assert payload is None
+    await jwt_backend._cache.delete(key)
+
+    assert await jwt_backend.decode_token(token) is not None
+
+
+@pytest.mark.asyncio
+async def test_revocation_single_round_trip():
+    cache = jwt_backend._cache
+    with mock.patch.object(
+        cache, "mget", wraps=cache.mget
+    ) as mock_mget, mock.patch.object(cache, "get", wraps=cache.get) as mock_get:
+        payload = await jwt_backend.decode_token(sample_access_token)
+        assert payload is not None
+        mock_mget.assert_awaited_once_with(
+            "users:blackout", "users:{1}:blacklist", "users:{1}:kick"
+        )
+        mock_get.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_key_rotation():
+    backend = JWTBackend(MockCacheBackend(), private_key, public_key, 60, 60 * 10)
+    old_kid = backend._keys.active_kid
+    old_token = backend.create_access_token({"id": 1})
+    assert jwt.get_unverified_header(old_token).get("kid") == old_kid
+    assert await backend.decode_token(old_token) is not None
+
+    new_private_key, new_public_key = generate_keys("RS256")
+    new_kid = backend.add_key(new_public_key, new_private_key, active=True)
+    new_token = backend.create_access_token({"id": 1})
+    assert jwt.get_unverified_header(new_token).get("kid") == new_kid
+
+    assert await backend.decode_token(old_token) is not None
+    assert await backend.decode_token(new_token) is not None
+
+    with pytest.raises(ValueError):
+        backend.retire_key(new_kid)
+
+    backend.retire_key(old_kid)
+    assert await backend.decode_token(old_token) is None
+    assert await backend.decode_token(new_token) is not None
+
+
+@pytest.mark.asyncio
+async def test_token_without_kid():
+    legacy_token = jwt.encode(
+        {"id": 1, "iat": datetime.utcnow(), "exp": int(time.time()) + 60},
+        private_key,
+        algorithm="RS256",
+    ).decode()
+    assert await jwt_backend.decode_token(legacy_token) is not None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("algorithm", ["RS256", "ES256", "EdDSA"])
+async def test_algorithms(algorithm: str):
+    algorithm_private_key, algorithm_public_key = generate_keys(algorithm)
+    backend = JWTBackend(
+        MockCacheBackend(),
+        algorithm_private_key,
+        algorithm_public_key,
+        60,
+        60 * 10,
+        algorithm=algorithm,
+    )
+    token = backend.create_access_token({"id": 1})
+    assert jwt.get_unverified_header(token).get("alg") == algorithm
+    payload = await backend.decode_token(token)
+    assert payload.get("id") == 1
+
+    assert await jwt_backend.decode_token(token) is None
+
+
+@pytest.mark.asyncio
+async def test_mixed_algorithms():
+    backend = JWTBackend(MockCacheBackend(), private_key, public_key, 60, 60 * 10)
+    rs256_token = backend.create_access_token({"id": 1})
+
+    eddsa_private_key, eddsa_public_key = generate_keys("EdDSA")
+    backend.add_key(eddsa_public_key, eddsa_private_key, active=True, algorithm="EdDSA")
+    eddsa_token = backend.create_access_token({"id": 1})
+
+    assert await backend.decode_token(rs256_token) is not None
+    assert await backend.decode_token(eddsa_token) is not None
+
+
+def test_unsupported_algorithm():
+    with pytest.raises(ValueError):
+        JWTBackend(
+            MockCacheBackend(), private_key, public_key, 60, 60, algorithm="HS256"
+        )
+
+
+@pytest.mark.asyncio
+async def test_revocation_mirror_needs_pool():
+    cache = MockCacheBackend()
+    cache.supports_pubsub = False
+    backend = JWTBackend(cache, private_key, public_key, 60, 60 * 10)
+    with pytest.raises(ValueError):
+        await backend.start_revocation_mirror()
+    assert backend._revocation_mirror is None
@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from fastapi_auth.core.config import BCRYPT_MIN_ROUNDS, BCRYPT_ROUNDS
+from fastapi_auth.core.password import (
+    PasswordHashLimiter,
+    calibrate_bcrypt_rounds,
+    configure_bcrypt_rounds,
+    get_password_hash,
+    get_password_hash_async,
+    password_needs_update,
+    pwd_context,
+    verify_password,
+    verify_password_async,
+)
+
+
+@pytest.mark.asyncio
+async def test_password_hash_async():
+    password_hash = await get_password_hash_async("12345678")
+    assert verify_password("12345678", password_hash)
+    assert await verify_password_async("12345678", password_hash)
+    assert not await verify_password_async("87654321", password_hash)
+
+
+@pytest.mark.asyncio
+async def test_password_hash_limiter():
+    limiter = PasswordHashLimiter(1, 1, 5)
+    release = asyncio.Event()
+
+    async def hold():
+        async with limiter:
+            await release.wait()
+
+    first = asyncio.ensure_future(hold())
+    second = asyncio.ensure_future(hold())
+    await asyncio.sleep(0)
+    assert limiter.stats().get("active") == 1
+    assert limiter.stats().get("waiting") == 1
+
+    with pytest.raises(HTTPException) as e:
+        async with limiter:
+            pass
+    assert e.value.status_code == 503
+    assert e.value.headers.get("Retry-After") == "5"
+
+    release.set()
+    await asyncio.gather(first, second)
+    assert limiter.stats() == {
+        "active": 0,
+        "waiting": 0,
+        "admitted": 2,
+        "queued": 1,
+        "shed": 1,
+    }
+
+
+@pytest.mark.asyncio
+async def test_password_hash_limiter_cancelled_waiter():
+    limiter = PasswordHashLimiter(1, 1, 5)
+    release = asyncio.Event()
+
+    async def hold():
+        async with limiter:
+            await release.wait()
+
+    first = asyncio.ensure_future(hold())
+    second = asyncio.ensure_future(hold())
+    await asyncio.sleep(0)
+    second.cancel()
+    release.set()
+    await first
+    with pytest.raises(asyncio.CancelledError):
+        await second
+
+    assert limiter.stats().get("active") == 0
+    assert limiter.stats().get("waiting") == 0
+
+
+def test_calibrate_bcrypt_rounds():
+    rounds, elapsed = calibrate_bcrypt_rounds(0, min_rounds=4, max_rounds=6)
+    assert rounds == 4
+
+    rounds, elapsed = calibrate_bcrypt_rounds(10_000, min_rounds=4, max_rounds=6)
+    assert rounds == 6
+    assert elapsed <= 10_000
+
+
+def test_configure_bcrypt_rounds():
+    configure_bcrypt_rounds(5)
+    try:
+        password_hash = get_password_hash("12345678")
+        assert password_hash.startswith("$2b$05$")
+        assert not password_needs_update(password_hash)
+
+        configure_bcrypt_rounds(6)
+        assert password_needs_update(password_hash)
+        assert not password_needs_update(get_password_hash("12345678"))
+    finally:
+        configure_bcrypt_rounds(BCRYPT_ROUNDS)
+        pwd_context.update(bcrypt__min_rounds=BCRYPT_MIN_ROUNDS)
+
+    assert get_password_hash("12345678").startswith(f"$2b${BCRYPT_ROUNDS:02d}$")
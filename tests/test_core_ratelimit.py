@@ -0,0 +1,171 @@
+from unittest import mock
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from fastapi_auth.core.ratelimit import (
+    LocalPrefilter,
+    RateLimit,
+    RateLimiter,
+    get_client_ip,
+)
+
+from .utils import MockCacheBackend
+
+
+async def hits(
+    limiter: RateLimiter, policy: RateLimit, now: float, n: int, key: str = "key"
+):
+    # only the limiter's clocks, asyncio must keep the real one
+    clock = mock.Mock(time=lambda: now, monotonic=lambda: now)
+    with mock.patch("fastapi_auth.core.ratelimit.time", clock), mock.patch(
+        "fastapi_auth.utils.cache.time", clock
+    ):
+        return [await limiter.hit(key, policy) for _ in range(n)]
+
+
+@pytest.mark.asyncio
+async def test_sliding_log(redis_cache):
+    limiter = RateLimiter(redis_cache, local_size=0)
+    policy = RateLimit(3, 60, "sliding_log")
+
+    assert await hits(limiter, policy, 1000, 3) == [(True, 0)] * 3
+    assert await hits(limiter, policy, 1030, 1) == [(False, 30)]
+    assert await hits(limiter, policy, 1060.5, 4) == [(True, 0)] * 3 + [(False, 60)]
+
+
+@pytest.mark.asyncio
+async def test_sliding_window(redis_cache):
+    limiter = RateLimiter(redis_cache, local_size=0)
+    policy = RateLimit(4, 60, "sliding_window")
+
+    assert await hits(limiter, policy, 60 * 100, 4) == [(True, 0)] * 4
+    assert await hits(limiter, policy, 60 * 100 + 59, 1) == [(False, 1)]
+    # half of the previous window still counts
+    assert await hits(limiter, policy, 60 * 101 + 30, 3) == [
+        (True, 0),
+        (True, 0),
+        (False, 0.001),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_gcra(redis_cache):
+    limiter = RateLimiter(redis_cache, local_size=0)
+    policy = RateLimit(6, 60, burst=2)
+
+    assert await hits(limiter, policy, 1000, 3) == [(True, 0), (True, 0), (False, 10)]
+    assert await hits(limiter, policy, 1010, 2) == [(True, 0), (False, 10)]
+
+
+def test_local_prefilter():
+    prefilter = LocalPrefilter(10)
+    with mock.patch("time.monotonic", return_value=100):
+        assert prefilter.check("key") is None
+        prefilter.block("key", 30)
+        prefilter.block("other", 0)
+        assert prefilter.check("other") is None
+    with mock.patch("time.monotonic", return_value=110):
+        assert prefilter.check("key") == 20
+    with mock.patch("time.monotonic", return_value=130):
+        assert prefilter.check("key") is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "policy",
+    [
+        RateLimit(4, 60, "sliding_log"),
+        RateLimit(4, 60, "sliding_window"),
+        RateLimit(4, 60, burst=2),
+    ],
+)
+async def test_local_prefilter_follows_redis(redis_cache, policy):
+    shared = RateLimiter(redis_cache, local_size=0)
+    local = RateLimiter(redis_cache)
+
+    for now in (6000, 6030, 6059, 6100, 6110, 6115, 6118, 6119, 6135, 6150):
+        results = [
+            await hits(limiter, policy, now, 2, name)
+            for limiter, name in ((shared, "shared"), (local, "local"))
+        ]
+        assert [allowed for allowed, _ in results[0]] == [
+            allowed for allowed, _ in results[1]
+        ]
+
+
+@pytest.mark.asyncio
+async def test_blocked_key_skips_redis():
+    cache = MockCacheBackend()
+    cache.run_script = mock.AsyncMock(side_effect=[[1, 0], [0, 30000]])
+    limiter = RateLimiter(cache)
+    policy = RateLimit(5, 60)
+
+    assert await limiter.hit("key", policy) == (True, 0)
+    assert await limiter.hit("key", policy) == (False, 30)
+    allowed, retry_after = await limiter.hit("key", policy)
+    assert not allowed and 0 < retry_after <= 30
+    assert cache.run_script.await_count == 2
+
+
+def test_rate_limit_algorithm():
+    with pytest.raises(ValueError):
+        RateLimit(1, 1, "fixed_window")
+
+
+@pytest.mark.parametrize(
+    "peer,forwarded,expected",
+    [
+        ("1.1.1.1", "", "1.1.1.1"),
+        ("1.1.1.1", "6.6.6.6", "1.1.1.1"),
+        ("10.0.0.1", "", "10.0.0.1"),
+        ("10.0.0.1", "2.2.2.2", "2.2.2.2"),
+        ("10.0.0.1", "6.6.6.6, 2.2.2.2, 10.0.0.2", "2.2.2.2"),
+        ("10.0.0.1", "10.0.0.2", "10.0.0.2"),
+    ],
+)
+def test_get_client_ip(peer, forwarded, expected):
+    request = mock.Mock()
+    request.client.host = peer
+    request.headers = {"x-forwarded-for": forwarded} if forwarded else {}
+    with mock.patch(
+        "fastapi_auth.core.ratelimit.TRUSTED_PROXIES", ["10.0.0.1", "10.0.0.2"]
+    ):
+        assert get_client_ip(request) == expected
+
+
+def test_dependency():
+    cache = MockCacheBackend()
+    cache.run_script = mock.AsyncMock(side_effect=[[1, 0], [0, 59500]])
+    limiter = RateLimiter(cache)
+    app = FastAPI()
+
+    @app.get(
+        "/limited",
+        dependencies=[Depends(limiter.dependency("limited", RateLimit(1, 60)))],
+    )
+    async def limited():
+        return None
+
+    test_client = TestClient(app)
+    assert test_client.get("/limited").status_code == 200
+    response = test_client.get("/limited")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "60"
+
+
+def test_dependency_fails_open():
+    cache = MockCacheBackend()
+    cache.run_script = mock.AsyncMock(side_effect=ConnectionError())
+    limiter = RateLimiter(cache)
+    app = FastAPI()
+
+    @app.get(
+        "/limited",
+        dependencies=[Depends(limiter.dependency("limited", RateLimit(1, 60)))],
+    )
+    async def limited():
+        return None
+
+    assert TestClient(app).get("/limited").status_code == 200
@@ -0,0 +1,80 @@
+import time
+from datetime import datetime, timedelta
+from unittest import mock
+
+import pytest
+
+from fastapi_auth.core.jwt import JWTBackend
+from fastapi_auth.core.revocation import RevocationMirror
+
+from .utils import MockCacheBackend, private_key, public_key
+
+
+def fresh(mirror: RevocationMirror) -> RevocationMirror:
+    mirror._subscriber._subscribed = True
+    mirror._subscriber._last_message = time.monotonic()
+    return mirror
+
+
+@pytest.mark.asyncio
+async def test_seed():
+    cache = MockCacheBackend()
+    now = int(time.time())
+    await cache.set("users:{1}:blacklist", 1, 60)
+    await cache.zadd("users:blacklist", now + 60, 1)
+    await cache.zadd("users:blacklist", now - 1, 4)
+    await cache.set("users:{2}:kick", now + 10, 60)
+    await cache.zadd("users:kicks", now + 10, 2)
+    await cache.zadd("users:kicks", now - 120, 5)
+    await cache.set("users:blackout", now - 3600, 0)
+
+    mirror = RevocationMirror(cache, 60, 30)
+    await mirror.seed()
+
+    iat = datetime.utcnow()
+    assert mirror.is_revoked(1, iat)
+    assert mirror.is_revoked(2, iat)
+    assert not mirror.is_revoked(3, iat)
+    assert not mirror.is_revoked(4, iat)
+    assert mirror.is_revoked(3, iat - timedelta(hours=2))
+    # kicked longer than the expiration ago
+    assert not mirror.is_revoked(5, iat - timedelta(minutes=5))
+
+
+def test_apply():
+    mirror = RevocationMirror(MockCacheBackend(), 60, 30)
+    iat = datetime.utcnow()
+    ts = int(time.time()) + 10
+
+    mirror.apply({"action": "BLACKLIST_ADD", "payload": {"id": 1}})
+    assert mirror.is_revoked(1, iat)
+    mirror.apply({"action": "BLACKLIST_REMOVE", "payload": {"id": 1}})
+    assert not mirror.is_revoked(1, iat)
+
+    mirror.apply({"action": "KICK", "payload": {"id": 2, "ts": ts}})
+    assert mirror.is_revoked(2, iat)
+    assert not mirror.is_revoked(2, iat + timedelta(seconds=60))
+
+    mirror.apply({"action": "BLACKOUT_SET", "payload": {"ts": ts}})
+    assert mirror.is_revoked(3, iat)
+    mirror.apply({"action": "BLACKOUT_DELETE", "payload": {}})
+    assert not mirror.is_revoked(3, iat)
+
+
+@pytest.mark.asyncio
+async def test_jwt_backend_uses_fresh_mirror():
+    cache = MockCacheBackend()
+    jwt_backend = JWTBackend(cache, private_key, public_key, 60, 60 * 10)
+    token = jwt_backend.create_access_token({"id": 1})
+
+    mirror = RevocationMirror(cache, 60, 30)
+    jwt_backend._revocation_mirror = mirror
+
+    with mock.patch.object(cache, "mget", wraps=cache.mget) as mock_mget:
+        assert await jwt_backend.decode_token(token) is not None
+        mock_mget.assert_awaited_once()
+
+    fresh(mirror).apply({"action": "BLACKLIST_ADD", "payload": {"id": 1}})
+    with mock.patch.object(cache, "mget", wraps=cache.mget) as mock_mget:
+        assert await jwt_backend.decode_token(token) is None
+        mock_mget.assert_not_called()
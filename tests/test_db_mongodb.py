@@ -0,0 +1,220 @@
+import asyncio
+from unittest import mock
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+from fastapi_auth.db.backend import MongoDBBackend
+from fastapi_auth.db.backend.mongodb import IdAllocator
+from fastapi_auth.exceptions import IndexConflictError
+
+
+def mock_collection(name: str, index_information: dict) -> mock.Mock:
+    collection = mock.Mock()
+    collection.name = name
+    collection.index_information = mock.AsyncMock(return_value=index_information)
+    collection.create_indexes = mock.AsyncMock(return_value=None)
+    return collection
+
+
+@pytest.mark.asyncio
+async def test_ensure_indexes():
+    backend = MongoDBBackend()
+    backend._users = mock_collection(
+        "users",
+        {
+            "_id_": {"key": [("_id", 1)]},
+            "id_1": {"key": [("id", 1.0)], "unique": True},
+        },
+    )
+    backend._email_confirmations = mock_collection(
+        "email_confirmations", {"_id_": {"key": [("_id", 1)]}}
+    )
+
+    missing = await backend.ensure_indexes(create=False)
+    assert missing == [
+        "users.email_unique",
+        "users.username_unique",
+        "users.username_lower",
+        "users.provider_sid_unique",
+        "users.blacklist",
+        "email_confirmations.token",
+        "email_confirmations.email",
+    ]
+    backend._users.create_indexes.assert_not_awaited()
+
+    await backend.ensure_indexes()
+    (models,), _ = backend._users.create_indexes.await_args
+    assert [model.document.get("name") for model in models] == [
+        "email_unique",
+        "username_unique",
+        "username_lower",
+        "provider_sid_unique",
+        "blacklist",
+    ]
+    backend._email_confirmations.create_indexes.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_ensure_indexes_option_conflict():
+    backend = MongoDBBackend()
+    backend._users = mock_collection(
+        "users", {"email_1": {"key": [("email", 1)], "unique": False}}
+    )
+    backend._email_confirmations = mock_collection("email_confirmations", {})
+
+    with pytest.raises(
+        IndexConflictError, match="users.email_unique exists as email_1"
+    ):
+        await backend.ensure_indexes(create=False)
+
+
+@pytest.mark.asyncio
+async def test_ensure_indexes_partial_filter():
+    backend = MongoDBBackend()
+    backend._users = mock_collection(
+        "users",
+        {
+            "provider_1_sid_1": {
+                "key": [("provider", 1), ("sid", 1)],
+                "unique": True,
+                "partialFilterExpression": {"provider": {"$exists": True}},
+            }
+        },
+    )
+    backend._email_confirmations = mock_collection("email_confirmations", {})
+    assert "users.provider_sid_unique" not in await backend.ensure_indexes(False)
+
+    backend._users.index_information.return_value = {
+        "provider_1_sid_1": {"key": [("provider", 1), ("sid", 1)], "unique": True}
+    }
+    with pytest.raises(IndexConflictError, match="provider_sid_unique"):
+        await backend.ensure_indexes(False)
+
+
+@pytest.mark.asyncio
+async def test_ensure_indexes_duplicates():
+    backend = MongoDBBackend()
+    backend._users = mock_collection("users", {})
+    backend._users.create_indexes.side_effect = DuplicateKeyError(
+        "E11000 duplicate key error index: email_unique", 11000
+    )
+    backend._email_confirmations = mock_collection("email_confirmations", {})
+
+    with pytest.raises(IndexConflictError, match="duplicate values"):
+        await backend.ensure_indexes()
+
+
+@pytest.mark.asyncio
+async def test_get_projection():
+    backend = MongoDBBackend()
+    backend._users = mock.Mock()
+    backend._users.find_one = mock.AsyncMock(return_value=None)
+
+    await backend.get(1)
+    backend._users.find_one.assert_awaited_with({"id": 1}, {"_id": 0})
+
+    await backend.get_by_email("user@gmail.com", ("email", "confirmed"))
+    backend._users.find_one.assert_awaited_with(
+        {"email": "user@gmail.com"}, {"_id": 0, "email": 1, "confirmed": 1}
+    )
+
+
+@pytest.mark.asyncio
+async def test_get_blacklist_page():
+    backend = MongoDBBackend()
+    backend._users = mock.Mock()
+    cursor = backend._users.find.return_value
+    cursor.sort.return_value.limit.return_value.to_list = mock.AsyncMock(
+        return_value=[]
+    )
+
+    await backend.get_blacklist(10, 50)
+    backend._users.find.assert_called_with(
+        {"active": False, "id": {"$gt": 10}}, {"_id": 0, "id": 1, "username": 1}
+    )
+    cursor.sort.assert_called_with("id", 1)
+    cursor.sort.return_value.limit.assert_called_with(51)
+
+
+def mock_counters() -> mock.Mock:
+    counters = mock.Mock()
+    counter = {"c": 7}
+
+    async def find_one_and_update(query, update, **kwargs):
+        await asyncio.sleep(0)
+        counter["c"] += update["$inc"]["c"]
+        return dict(counter)
+
+    counters.find_one_and_update = mock.AsyncMock(side_effect=find_one_and_update)
+    return counters
+
+
+@pytest.mark.asyncio
+async def test_id_allocator():
+    counters = mock_counters()
+    allocator = IdAllocator("users", 10)
+
+    assert await allocator.allocate(counters) == [8]
+    assert await allocator.allocate(counters, 3) == [9, 10, 11]
+    assert await allocator.allocate(counters, 8) == list(range(12, 20))
+    assert counters.find_one_and_update.await_count == 2
+
+    assert await allocator.allocate(counters, 25) == list(range(20, 45))
+    assert counters.find_one_and_update.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_id_allocator_concurrent():
+    counters = mock_counters()
+    allocator = IdAllocator("users", 10)
+
+    ids = await asyncio.gather(*[allocator.allocate(counters) for _ in range(10)])
+    assert sorted(i for (i,) in ids) == list(range(8, 18))
+    counters.find_one_and_update.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_backfill():
+    class Cursor:
+        def __init__(self, items):
+            self._items = iter(items)
+
+        def batch_size(self, size):
+            return self
+
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            try:
+                return next(self._items)
+            except StopIteration:
+                raise StopAsyncIteration
+
+    backend = MongoDBBackend()
+    backend._users = mock.Mock()
+    backend._users.find = mock.Mock(
+        return_value=Cursor(
+            [{"_id": i, "username": f"User{i}"} for i in range(3)] + [{"_id": 3}]
+        )
+    )
+    backend._users.bulk_write = mock.AsyncMock(return_value=None)
+
+    updated = await backend.backfill(
+        "username_lower",
+        ("username",),
+        lambda item: (
+            {"username_lower": item["username"].lower()} if "username" in item else {}
+        ),
+        2,
+    )
+
+    assert updated == 3
+    backend._users.find.assert_called_once_with(
+        {"username_lower": {"$exists": False}, "username": {"$ne": None}},
+        {"username": 1},
+    )
+    assert backend._users.bulk_write.await_count == 2
+    (requests,), _ = backend._users.bulk_write.await_args
+    assert requests[0]._doc == {"$set": {"username_lower": "user2"}}
@@ -0,0 +1,237 @@
+import asyncio
+from unittest import mock
+
+import aioredis
+import pytest
+from aioredis import Redis
+from aioredis.connection import RedisConnection
+from aioredis.errors import ReplyError
+
+from fastapi_auth.core import keys
+from fastapi_auth.db.backend import RedisBackend, RedisScript
+from fastapi_auth.db.backend.redis import key_slot
+
+script = RedisScript("return 1")
+
+
+@pytest.mark.asyncio
+async def test_run_script():
+    backend = RedisBackend()
+    redis = mock.Mock()
+    redis.evalsha = mock.AsyncMock(
+        side_effect=[ReplyError("NOSCRIPT No matching script."), 1, 1]
+    )
+    redis.script_load = mock.AsyncMock(return_value=script.sha)
+    backend.set_client(redis)
+
+    assert await backend.run_script(script, ["key"], [1]) == 1
+    redis.script_load.assert_awaited_once_with("return 1")
+    redis.evalsha.assert_awaited_with(script.sha, ["key"], [1])
+
+    assert await backend.run_script(script, ["key"], [1]) == 1
+    redis.script_load.assert_awaited_once()
+    assert redis.evalsha.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_run_script_error():
+    backend = RedisBackend()
+    redis = mock.Mock()
+    redis.evalsha = mock.AsyncMock(side_effect=ReplyError("ERR wrong type"))
+    redis.script_load = mock.AsyncMock()
+    backend.set_client(redis)
+
+    with pytest.raises(ReplyError):
+        await backend.run_script(script, [], [])
+    redis.script_load.assert_not_awaited()
+
+
+def redis_client(reply=b"OK") -> Redis:
+    conn = mock.Mock()
+
+    def execute(command, *args, **kwargs):
+        future = asyncio.get_event_loop().create_future()
+        future.set_result(reply)
+        return future
+
+    conn.execute = mock.Mock(side_effect=execute)
+    return Redis(conn)
+
+
+@pytest.mark.asyncio
+async def test_set():
+    backend = RedisBackend()
+    redis = redis_client()
+    backend.set_client(redis)
+
+    await backend.set("key", 1)
+    redis._pool_or_conn.execute.assert_called_with(b"SET", "key", 1)
+    await backend.set("key", 1, 60)
+    redis._pool_or_conn.execute.assert_called_with(b"SET", "key", 1, b"EX", 60)
+
+
+@pytest.mark.asyncio
+async def test_setnx():
+    backend = RedisBackend()
+    redis = redis_client()
+    backend.set_client(redis)
+
+    assert await backend.setnx("key", 1, 60)
+    redis._pool_or_conn.execute.assert_called_once_with(
+        b"SET", "key", 1, b"EX", 60, b"NX"
+    )
+
+    backend.set_client(redis_client(None))
+    assert not await backend.setnx("key", 1, 60)
+
+
+@pytest.mark.asyncio
+async def test_pipeline():
+    backend = RedisBackend()
+    redis = mock.Mock()
+    tr = redis.multi_exec.return_value
+    tr.execute = mock.AsyncMock()
+    backend.set_client(redis)
+
+    async with backend.pipeline() as pipe:
+        pipe.set("key", 1, 60)
+        pipe.zadd("zset", 10, "member")
+        tr.execute.assert_not_awaited()
+
+    tr.set.assert_called_once_with("key", 1, expire=60)
+    tr.zadd.assert_called_once_with("zset", 10, "member")
+    tr.execute.assert_awaited_once()
+
+    redis.pipeline.return_value.execute = mock.AsyncMock()
+    async with backend.pipeline(transaction=False):
+        pass
+    redis.pipeline.return_value.execute.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_getset():
+    backend = RedisBackend()
+    redis = mock.Mock()
+    redis.getset = mock.AsyncMock(return_value="old")
+    tr = redis.multi_exec.return_value
+    tr.execute = mock.AsyncMock()
+    tr.getset.return_value = asyncio.get_event_loop().create_future()
+    tr.getset.return_value.set_result("previous")
+    backend.set_client(redis)
+
+    assert await backend.getset("key", 1) == "old"
+    redis.multi_exec.assert_not_called()
+
+    assert await backend.getset("key", 2, 60) == "previous"
+    tr.getset.assert_called_once_with("key", 2)
+    tr.expire.assert_called_once_with("key", 60)
+    tr.execute.assert_awaited_once()
+
+
+def test_key_slot():
+    assert key_slot("123456789") == 0x31C3
+    assert key_slot("foo") == 12182
+    assert key_slot("{user1000}.following") == key_slot("user1000")
+    # an empty tag hashes the whole key
+    assert key_slot("foo{}{bar}") != key_slot("foo{}{bar}x")
+    assert key_slot("foo{{bar}}zap") == key_slot("{bar")
+
+
+def test_key_tags():
+    assert key_slot(keys.user_blacklist(1)) == key_slot(keys.user_kick(1))
+    assert key_slot(keys.login_timeout("::1")) == key_slot(keys.login_rate("::1"))
+    assert key_slot(keys.rate_limit("auth:register:1.1.1.1", 1)) == key_slot(
+        keys.rate_limit("auth:register:1.1.1.1", 2)
+    )
+
+
+@pytest.mark.asyncio
+async def test_mget_cluster():
+    backend = RedisBackend(cluster=True)
+    redis = mock.Mock()
+    redis.mget = mock.AsyncMock(side_effect=lambda *k: [f"v:{key}" for key in k])
+    backend.set_client(redis)
+
+    all_keys = [keys.BLACKOUT, keys.user_blacklist(1), keys.user_kick(1)]
+    assert await backend.mget(*all_keys) == [f"v:{key}" for key in all_keys]
+    redis.mget.assert_has_awaits(
+        [mock.call(keys.BLACKOUT), mock.call(*all_keys[1:])], any_order=True
+    )
+    assert redis.mget.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_pipeline_cluster():
+    backend = RedisBackend(cluster=True)
+    redis = mock.Mock()
+    redis.pipeline.return_value.execute = mock.AsyncMock()
+    backend.set_client(redis)
+
+    async with backend.pipeline():
+        pass
+    redis.multi_exec.assert_not_called()
+    redis.pipeline.return_value.execute.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_scan_cluster():
+    def node(*node_keys):
+        async def iscan(match, count):
+            for key in node_keys:
+                yield key
+
+        return mock.Mock(iscan=iscan)
+
+    backend = RedisBackend(cluster=True)
+    redis = mock.Mock()
+    redis.all_masters = mock.AsyncMock(return_value=[node("a", "b"), node("c")])
+    backend.set_client(redis)
+
+    assert [key async for key in backend.scan("*")] == ["a", "b", "c"]
+
+
+@pytest.mark.asyncio
+async def test_scan(redis_cache):
+    for i in range(25):
+        await redis_cache.set(f"users:kick:{i}", i)
+    await redis_cache.set("users:{1}:kick", 1)
+
+    found = [key async for key in redis_cache.scan("users:kick:*", count=10)]
+    assert sorted(found) == sorted(f"users:kick:{i}" for i in range(25))
+
+
+@pytest.mark.asyncio
+async def test_subscribe_needs_pool():
+    backend = RedisBackend()
+    redis = mock.Mock()
+    redis.connection = mock.Mock(spec=RedisConnection)
+    redis.subscribe = mock.AsyncMock()
+    backend.set_client(redis)
+
+    assert not backend.supports_pubsub
+    with pytest.raises(TypeError):
+        await backend.subscribe("chan")
+    redis.subscribe.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_subscribe_pool(redis_cache):
+    assert not redis_cache.supports_pubsub
+
+    pool = await aioredis.create_redis_pool(
+        redis_cache._redis.address, db=redis_cache._redis.db, encoding="utf-8"
+    )
+    backend = RedisBackend()
+    backend.set_client(pool)
+    try:
+        assert backend.supports_pubsub
+        channel = await backend.subscribe("chan")
+        await backend.set("key", "value")
+        assert await backend.get("key") == "value"
+
+        await backend.dispatch_action("chan", "ACTION", {})
+        assert (await channel.get_json()).get("action") == "ACTION"
+        await backend.unsubscribe("chan")
+    finally:
+        pool.close()
+        await pool.wait_closed()
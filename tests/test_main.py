@@ -0,0 +1,40 @@
+from unittest import mock
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from fastapi_auth import Auth, User
+
+from .utils import ACCESS_COOKIE_NAME, REFRESH_COOKIE_NAME, public_key
+
+auth = Auth(ACCESS_COOKIE_NAME, REFRESH_COOKIE_NAME, public_key, 60 * 5, 60 * 10)
+
+app = FastAPI()
+
+
+@app.get("/admin", dependencies=[Depends(auth.admin_required)])
+async def admin(
+    user: User = Depends(auth.get_authenticated_user),
+    anonim: User = Depends(auth.get_user),
+):
+    return {"id": user.id, "same": user is anonim}
+
+
+test_client = TestClient(app)
+
+
+def test_user_memoized_per_request():
+    with mock.patch.object(
+        auth._auth_backend,
+        "decode_token",
+        mock.AsyncMock(return_value={"id": 1, "permissions": ["admin"]}),
+    ) as mock_decode_token:
+        test_client.cookies.set(ACCESS_COOKIE_NAME, "ACCESS")
+        response = test_client.get("/admin")
+        assert response.status_code == 200
+        assert response.json() == {"id": 1, "same": True}
+        mock_decode_token.assert_awaited_once_with("ACCESS")
+
+        response = test_client.get("/admin")
+        assert response.status_code == 200
+        assert mock_decode_token.await_count == 2
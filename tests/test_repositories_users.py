@@ -0,0 +1,403 @@
+import time
+from datetime import datetime
+from unittest import mock
+
+import pytest
+
+from fastapi_auth.repositories import UsersRepo
+
+from .utils import MockCacheBackend, MockDatabaseBackend
+
+
+@pytest.fixture
+def repo():
+    return UsersRepo(MockDatabaseBackend("test"), MockCacheBackend(), [])
+
+
+@pytest.fixture
+def redis_repo(redis_cache):
+    return UsersRepo(MockDatabaseBackend("test"), redis_cache, [])
+
+
+def fresh(repo: UsersRepo) -> UsersRepo:
+    repo._local_subscriber._subscribed = True
+    repo._local_subscriber._last_message = time.monotonic()
+    return repo
+
+
+@pytest.mark.asyncio
+async def test_get_cached(repo):
+    created_at = datetime(2020, 1, 2, 3, 4, 5, 678000)
+    await repo._database.update(2, {"created_at": created_at})
+
+    item = await repo.get(2)
+    assert await repo._cache.get("users:{2}:doc") is not None
+
+    repo._database._users = []
+    cached = await repo.get(2)
+    assert cached == item
+    assert cached.get("created_at") == created_at
+
+
+@pytest.mark.asyncio
+async def test_get_missing_not_cached(repo):
+    assert await repo.get(999) is None
+    assert await repo._cache.get("users:{999}:doc") is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "method,args,field,value",
+    [
+        ("update", ({"active": False},), "active", False),
+        ("set_password", ("hash",), "password", "hash"),
+        ("change_username", ("renamed",), "username", "renamed"),
+    ],
+)
+async def test_writes_invalidate(repo, method, args, field, value):
+    await repo.get(2)
+    await getattr(repo, method)(2, *args)
+    assert await repo._cache.get("users:{2}:doc") is None
+    assert (await repo.get(2)).get(field) == value
+
+
+@pytest.mark.asyncio
+async def test_delete_invalidates(repo):
+    await repo.get(2)
+    await repo.delete(2)
+    assert await repo.get(2) is None
+
+
+@pytest.mark.asyncio
+async def test_confirm_email_invalidates(repo):
+    assert not (await repo.get(3)).get("confirmed")
+    await repo.request_email_confirmation("anotheruser@gmail.com", "token")
+    assert await repo.confirm_email("token")
+    assert (await repo.get(3)).get("confirmed")
+    assert not await repo.confirm_email("wrong")
+
+
+@pytest.mark.asyncio
+async def test_local_cache(repo):
+    fresh(repo)
+    item = await repo.get(2)
+    await repo._cache.delete("users:{2}:doc")
+    repo._database._users = []
+
+    cached = await repo.get(2)
+    assert cached == item
+    cached["permissions"].append("admin")
+    assert (await repo.get(2)).get("permissions") == []
+
+
+@pytest.mark.asyncio
+async def test_local_cache_unused_when_stale(repo):
+    await repo.get(2)
+    assert len(repo._local_users) == 0
+
+
+@pytest.mark.asyncio
+async def test_local_mappings(repo):
+    fresh(repo)
+    await repo.get_by_email("user@gmail.com")
+    await repo.get_by_username("admin")
+    await repo._cache.delete("users:{1}:doc")
+    await repo._cache.delete("users:{2}:doc")
+    users = repo._database._users
+    repo._database._users = []
+
+    assert (await repo.get_by_email("user@gmail.com")).get("id") == 2
+    assert (await repo.get_by_username("admin")).get("id") == 1
+
+    repo._database._users = users
+    await repo.change_username(2, "renamed")
+    assert await repo.get_by_username("user") is None
+    assert (await repo.get_by_username("renamed")).get("id") == 2
+
+
+@pytest.mark.asyncio
+async def test_local_invalidation(repo):
+    fresh(repo)
+    await repo.get(2)
+    await repo.update(2, {"active": False})
+    assert (await repo.get(2)).get("active") is False
+
+    await repo.get(1)
+    repo._apply_invalidation({"action": "INVALIDATE", "payload": {"id": 1}})
+    assert repo._local_users.get(1) is None
+
+    await repo.get(1)
+    await repo._clear_local()
+    assert len(repo._local_users) == 0
+    assert len(repo._local_ids) == 0
+
+
+@pytest.mark.asyncio
+async def test_get_projection(repo):
+    repo._database.get = mock.AsyncMock(wraps=repo._database.get)
+    item = await repo.get(2, ("email", "confirmed"))
+    assert item == {"email": "user@gmail.com", "confirmed": True}
+    assert await repo._cache.get("users:{2}:doc") is not None
+
+    assert await repo.get(2, ("username",)) == {"username": "user"}
+    repo._database.get.assert_awaited_once_with(2)
+
+
+@pytest.mark.asyncio
+async def test_get_ignores_doc_read_before_write(repo):
+    read = repo._database.get
+
+    async def slow_read(id, fields=None):
+        item = dict(await read(id, fields))
+        # a writer commits and invalidates while this read is in flight
+        await repo.update(id, {"active": False})
+        return item
+
+    with mock.patch.object(repo._database, "get", slow_read):
+        assert (await repo.get(2)).get("active") is True
+    assert await repo._cache.get("users:{2}:doc") is not None
+
+    assert (await repo.get(2)).get("active") is False
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("remote", [False, True])
+async def test_local_ignores_doc_read_before_write(repo, remote):
+    fresh(repo)
+    read = repo._database.get
+
+    async def slow_read(id, fields=None):
+        item = dict(await read(id, fields))
+        if remote:
+            # another node writes, its invalidation arrives over pub/sub
+            await repo._database.update(id, {"active": False})
+            await repo._cache.set("users:{2}:version", "remote")
+            repo._apply_invalidation({"action": "INVALIDATE", "payload": {"id": id}})
+        else:
+            await repo.update(id, {"active": False})
+        return item
+
+    with mock.patch.object(repo._database, "get", slow_read):
+        assert (await repo.get(2)).get("active") is True
+    assert repo._local_users.get(2) is None
+    assert repo._local_ids.get(("username", "user")) is None
+    assert not repo._local_reads
+
+    assert (await repo.get(2)).get("active") is False
+    assert repo._local_users.get(2).get("active") is False
+
+
+@pytest.mark.asyncio
+async def test_get_projection_without_cache(repo):
+    with mock.patch("fastapi_auth.repositories.users.USER_CACHE_TTL", 0):
+        item = await repo.get(2, ("email", "confirmed"))
+    assert item == {"email": "user@gmail.com", "confirmed": True}
+    assert await repo._cache.get("users:{2}:doc") is None
+
+
+@pytest.mark.asyncio
+async def test_get_by_field_projection_fills_cache(repo):
+    fresh(repo)
+    assert await repo.get_by_login("user", ("id", "active")) == {
+        "id": 2,
+        "active": True,
+    }
+    assert await repo._cache.get("users:{2}:doc") is not None
+    assert repo._local_users.get(2).get("username") == "user"
+
+
+@pytest.mark.asyncio
+async def test_local_projection(repo):
+    fresh(repo)
+    await repo.get_by_username("user", ("id",))
+    await repo._cache.delete("users:{2}:doc")
+    repo._database._users = []
+    assert await repo.get_by_login("user", ("id", "active")) == {
+        "id": 2,
+        "active": True,
+    }
+
+
+@pytest.mark.asyncio
+async def test_search_fields_maintained(repo):
+    id = await repo.create({"email": "new@gmail.com", "username": "NewUser"})
+    assert repo._database._get("id", id).get("username_lower") == "newuser"
+
+    await repo.change_username(id, "Renamed")
+    assert repo._database._get("id", id).get("username_lower") == "renamed"
+
+    await repo.create_many([{"email": "bulk@gmail.com", "username": "Bulk"}])
+    assert repo._database._get("username", "Bulk").get("username_lower") == "bulk"
+
+
+@pytest.mark.asyncio
+async def test_backfill_search_fields_without_username(repo):
+    repo._database.backfill = mock.AsyncMock(return_value=1)
+    with mock.patch("fastapi_auth.repositories.users.USERNAME_TRIGRAMS", False):
+        await repo.backfill_search_fields()
+        (_, _, compute, _), _ = repo._database.backfill.await_args
+        assert compute({"_id": 1}) == {}
+        assert compute({"_id": 2, "username": "User"}) == {"username_lower": "user"}
+
+
+def legacy(pattern: str) -> dict:
+    return {
+        "username_lower": {"$exists": False},
+        "username": {"$regex": pattern, "$options": "i"},
+    }
+
+
+def test_search_filter(repo):
+    assert repo._search_filter(1, "user") == {"id": 1}
+    assert repo._search_filter(None, " ") == {}
+    assert repo._search_filter(None, "Us.er*") == {
+        "$or": [{"username_lower": {"$regex": r"^us\.er\*"}}, legacy(r"^us\.er\*")]
+    }
+    assert repo._search_filter(None, "ser", "contains") == {
+        "$or": [{"username_lower": {"$regex": "ser"}}, legacy("ser")]
+    }
+
+    with mock.patch("fastapi_auth.repositories.users.USERNAME_TRIGRAMS", True):
+        f = {"username_lower": {"$regex": "user"}}
+        assert repo._search_filter(None, "User", "contains") == {
+            "$or": [
+                {
+                    "$or": [
+                        {"$and": [{"username_trigrams": {"$all": ["ser", "use"]}}, f]},
+                        {"username_trigrams": {"$exists": False}, **f},
+                    ]
+                },
+                legacy("user"),
+            ]
+        }
+        assert repo._search_filter(None, "us", "contains") == {
+            "$or": [{"username_lower": {"$regex": "us"}}, legacy("us")]
+        }
+        assert repo._search_fields("User") == {
+            "username_lower": "user",
+            "username_trigrams": ["ser", "use"],
+        }
+
+
+@pytest.mark.asyncio
+async def test_blacklist(repo):
+    await repo.toggle_blacklist(2)
+    await repo._cache.zadd("users:blacklist", time.time() - 1, 3)
+
+    blacklist = await repo.get_blacklist()
+    assert blacklist["current"] == ["2"]
+    assert {"id": 2, "username": "user"} in blacklist["global"]
+    assert await repo._cache.zrangebyscore("users:blacklist") == ["2"]
+    assert await repo._cache.get("users:{2}:blacklist") is not None
+
+    await repo.toggle_blacklist(2)
+    assert (await repo.get_blacklist())["current"] == []
+    assert await repo._cache.get("users:{2}:blacklist") is None
+
+
+@pytest.mark.asyncio
+async def test_blacklist_pages(repo):
+    await repo.update(1, {"active": False})
+    inactive = sorted(
+        item["id"] for item in repo._database._users if not item.get("active")
+    )
+
+    first = await repo.get_blacklist(size=2)
+    assert [item["id"] for item in first["global"]] == inactive[:2]
+    assert first["next"] == inactive[1]
+
+    last = await repo.get_blacklist(first["next"], 2)
+    assert [item["id"] for item in last["global"]] == inactive[2:]
+    assert last["next"] is None
+
+
+@pytest.mark.asyncio
+async def test_kick(repo):
+    await repo._cache.zadd("users:kicks", time.time() - repo._access_expiration - 1, 3)
+    await repo.kick(2)
+
+    assert await repo._cache.get("users:{2}:kick") is not None
+    ((id, ts),) = await repo._cache.zrangebyscore_withscores("users:kicks")
+    assert id == "2"
+    # epoch seconds, whatever the host time zone
+    assert abs(ts - time.time()) < 5
+
+
+@pytest.mark.asyncio
+async def test_is_bruteforce(redis_repo):
+    repo = redis_repo
+    with mock.patch("fastapi_auth.repositories.users.LOGIN_RATELIMIT", 3):
+        assert [await repo.is_bruteforce("127.0.0.1", "user") for _ in range(5)] == [
+            False,
+            False,
+            False,
+            True,
+            True,
+        ]
+        assert not await repo.is_bruteforce("127.0.0.2", "user")
+    assert 0 < await repo._cache.pttl("users:login:{127.0.0.1}:timeout") <= 60000
+    assert 0 < await repo._cache.pttl("users:login:{127.0.0.1}:rate") <= 60000
+
+
+@pytest.mark.asyncio
+async def test_is_bruteforce_blocked_locally(redis_repo):
+    repo = redis_repo
+    await repo._cache.set("users:login:{127.0.0.1}:timeout", 1, 30)
+    repo._cache.run_script = mock.AsyncMock(wraps=repo._cache.run_script)
+
+    assert await repo.is_bruteforce("127.0.0.1", "user")
+    assert await repo.is_bruteforce("127.0.0.1", "user")
+    assert repo._cache.run_script.await_count == 1
+    assert 29 < repo._login_prefilter.check("127.0.0.1") <= 30
+
+
+@pytest.mark.asyncio
+async def test_check_timeout_and_incr(redis_repo):
+    repo = redis_repo
+    assert [await repo._check_timeout_and_incr("key", 2, 60) for _ in range(3)] == [
+        True,
+        True,
+        False,
+    ]
+    assert await repo._cache.get("key") == "2"
+    assert 0 < await repo._cache.pttl("key") <= 60000
+
+
+@pytest.mark.asyncio
+async def test_migrate_revocation_keys(repo):
+    now = int(time.time())
+    await repo._cache.set("users:blacklist:2", 1, 60)
+    await repo._cache.set("users:kick:3", now, 60)
+
+    assert await repo.migrate_revocation_keys() == 2
+    assert await repo._cache.get("users:blacklist:2") is None
+    assert await repo._cache.get("users:{2}:blacklist") == 1
+    assert await repo._cache.zrangebyscore("users:blacklist") == ["2"]
+    assert await repo._cache.get("users:{3}:kick") == now
+    assert await repo._cache.zrangebyscore_withscores("users:kicks") == [("3", now)]
+
+    assert await repo.migrate_revocation_keys() == 0
+
+
+@pytest.mark.asyncio
+async def test_migrate_revocation_keys_batches(redis_repo):
+    now = int(time.time())
+    for id in range(1, 8):
+        await redis_repo._cache.set(f"users:blacklist:{id}", 1, 60)
+    await redis_repo._cache.set("users:kick:9", now)
+
+    with mock.patch.object(
+        redis_repo, "_move_legacy_keys", wraps=redis_repo._move_legacy_keys
+    ) as move:
+        assert (
+            await redis_repo._migrate_legacy_keys(
+                "users:blacklist:*", mock.Mock(), batch_size=3
+            )
+            == 7
+        )
+    assert [len(call.args[0]) for call in move.await_args_list] == [3, 3, 1]
+    assert await redis_repo._cache.get("users:blacklist:1") is None
+
+    assert await redis_repo.migrate_revocation_keys() == 1
+    assert await redis_repo._cache.get("users:{9}:kick") == str(now)
+    assert 0 < await redis_repo._cache.pttl("users:{9}:kick") <= 60 * 60 * 6 * 1000
@@ -29,10 +29,11 @@ def test_get_blacklist():
         "fastapi_auth.routers.admin.AdminService.get_blacklist",
         mock.AsyncMock(return_value=None),
     ) as mock_method:
-        response = test_client.get(url)
-        mock_method.assert_awaited_once()
+        response = test_client.get(url, params={"after": 5, "size": 10})
+        mock_method.assert_awaited_once_with(5, 10)
 
     assert response.status_code == 200
+    assert test_client.get(url, params={"size": 0}).status_code == 422
 
 
 def test_toggle_blacklist():
@@ -105,3 +106,15 @@ def test_kick():
         mock_method.assert_awaited_once_with(5)
 
     assert response.status_code == 200
+
+
+def test_get_password_hash_stats():
+    url = app.url_path_for("admin:get_password_hash_stats")
+    with mock.patch(
+        "fastapi_auth.routers.admin.AdminService.get_password_hash_stats",
+        mock.AsyncMock(return_value=None),
+    ) as mock_method:
+        response = test_client.get(url)
+        mock_method.assert_awaited_once()
+
+    assert response.status_code == 200
@@ -3,9 +3,16 @@ from unittest import mock
 from fastapi import FastAPI
 from fastapi.testclient import TestClient
 
+from fastapi_auth.core.ratelimit import RateLimit, RateLimiter
 from fastapi_auth.routers import get_password_router
 
-from .utils import MockAuthBackend, mock_get_authenticated_user, private_key, public_key
+from .utils import (
+    MockAuthBackend,
+    MockCacheBackend,
+    mock_get_authenticated_user,
+    private_key,
+    public_key,
+)
 
 app = FastAPI()
 
@@ -118,3 +125,43 @@ def test_password_change():
         mock_method.assert_awaited_once()
 
     assert response.status_code == 200
+
+
+def test_forgot_password_rate_limited():
+    cache = MockCacheBackend()
+    cache.run_script = mock.AsyncMock(side_effect=[[1, 0], [0, 60000]])
+    limiter = RateLimiter(cache)
+    limited_app = FastAPI()
+    limited_app.include_router(
+        get_password_router(
+            None,
+            MockAuthBackend("RS256", private_key, public_key),
+            mock_get_authenticated_user,
+            True,
+            "RU",
+            "http://127.0.0.1",
+            "127.0.0.1",
+            None,
+            None,
+            None,
+            None,
+            None,
+            None,
+            {
+                "auth:forgot_password": limiter.dependency(
+                    "auth:forgot_password", RateLimit(1, 60, "sliding_log")
+                )
+            },
+        )
+    )
+    limited_client = TestClient(limited_app)
+    url = limited_app.url_path_for("auth:forgot_password")
+    with mock.patch(
+        "fastapi_auth.routers.password.PasswordService.forgot_password",
+        mock.AsyncMock(return_value=None),
+    ) as mock_method:
+        assert limited_client.post(url, json={}).status_code == 200
+        response = limited_client.post(url, json={})
+        mock_method.assert_awaited_once()
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
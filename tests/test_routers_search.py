@@ -42,6 +42,21 @@ def test_search():
         mock.AsyncMock(return_value=None),
     ) as mock_method:
         response = test_client.get(f"{url}?id=1&username=admin&p=1")
-        mock_method.assert_awaited_once_with(1, "admin", 1)
+        mock_method.assert_awaited_once_with(1, "admin", 1, None, "exact", "prefix")
 
     assert response.status_code == 200
+
+
+def test_search_cursor():
+    url = app.url_path_for("auth:search")
+    with mock.patch(
+        "fastapi_auth.routers.search.SearchService.search",
+        mock.AsyncMock(return_value=None),
+    ) as mock_method:
+        response = test_client.get(f"{url}?cursor=MjA=&total=none&match=contains")
+        mock_method.assert_awaited_once_with(None, None, 1, "MjA=", "none", "contains")
+
+    assert response.status_code == 200
+
+    response = test_client.get(f"{url}?total=wrong")
+    assert response.status_code == 422
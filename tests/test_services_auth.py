@@ -1,8 +1,11 @@
+import asyncio
 from unittest import mock
 
 import pytest
 from fastapi import HTTPException
+from passlib.hash import django_pbkdf2_sha256
 
+from fastapi_auth.core.password import verify_password
 from fastapi_auth.repositories import UsersRepo
 from fastapi_auth.services import AuthService
 from fastapi_auth.utils.strings import create_random_string, hash_string
@@ -12,7 +15,7 @@ from .utils import (
     MockCacheBackend,
     MockDatabaseBackend,
     User,
-    mock_verify_password,
+    mock_verify_password_async,
     private_key,
     public_key,
 )
@@ -25,6 +28,19 @@ RECAPTCHA_SECRET = "RECAPTCHA_SECRET"
 auth_backend = MockAuthBackend("RS256", private_key, public_key)
 
 
+@pytest.fixture(autouse=True)
+def allow_requests():
+    # the Lua limits are tested against Redis in test_repositories_users
+    with mock.patch.object(
+        UsersRepo, "is_bruteforce", mock.AsyncMock(return_value=False)
+    ), mock.patch.object(
+        UsersRepo,
+        "is_email_confirmation_available",
+        mock.AsyncMock(return_value=True),
+    ):
+        yield
+
+
 @pytest.fixture(autouse=True)
 def auth_service_setup():
     AuthService.setup(
@@ -129,7 +145,9 @@ async def test_register(
         ("admin@gmail.com", "12345678"),
     ],
 )
-@mock.patch("fastapi_auth.services.auth.verify_password", mock_verify_password)
+@mock.patch(
+    "fastapi_auth.services.auth.verify_password_async", mock_verify_password_async
+)
 async def test_login(login: str, password: str):
     auth_service = AuthService()
     tokens = await auth_service.login(
@@ -139,6 +157,44 @@ async def test_login(login: str, password: str):
     assert isinstance(tokens, dict)
 
 
+@pytest.mark.asyncio
+async def test_background_task_error():
+    async def fail():
+        raise RuntimeError("boom")
+
+    with mock.patch("fastapi_auth.services.auth.logger") as mock_logger:
+        AuthService._run_in_background(fail())
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+    assert not AuthService._background_tasks
+    mock_logger.info.assert_called_once_with(
+        "background_task error=RuntimeError('boom')"
+    )
+
+
+@pytest.mark.asyncio
+async def test_login_rehash():
+    auth_service = AuthService()
+    legacy_hash = django_pbkdf2_sha256.hash("12345678")
+    await auth_service._repo.update(2, {"password": legacy_hash})
+
+    with mock.patch(
+        "fastapi_auth.services.auth.AuthService._rehash_password",
+        mock.AsyncMock(return_value=None),
+    ) as mock_rehash:
+        await auth_service.login({"login": "user", "password": "12345678"}, "1.1.1.1")
+        assert len(AuthService._background_tasks) == 1
+        await asyncio.sleep(0)
+        mock_rehash.assert_awaited_once_with(2, "12345678")
+        await asyncio.sleep(0)
+        assert not AuthService._background_tasks
+
+    await auth_service._rehash_password(2, "12345678")
+    item = await auth_service._repo.get(2)
+    assert item.get("password").startswith("$2b$")
+    assert verify_password("12345678", item.get("password"))
+
+
 @pytest.mark.asyncio
 async def test_refresh_access_token() -> str:
     auth_service = AuthService()
@@ -13,7 +13,7 @@ from .utils import (
     MockDatabaseBackend,
     MockEmailClient,
     User,
-    mock_verify_password,
+    mock_verify_password_async,
     private_key,
     public_key,
 )
@@ -42,6 +42,15 @@ auth_backend = MockAuthBackend("RS256", private_key, public_key)
 # )
 
 
+@pytest.fixture(autouse=True)
+def allow_requests():
+    # the Lua limits are tested against Redis in test_repositories_users
+    with mock.patch.object(
+        UsersRepo, "is_password_reset_available", mock.AsyncMock(return_value=True)
+    ):
+        yield
+
+
 @pytest.fixture(autouse=True)
 def password_service_setup():
     PasswordService.setup(
@@ -124,7 +133,10 @@ async def test_password_reset():
 
 
 @pytest.mark.asyncio
-@mock.patch("fastapi_auth.services.password.verify_password", mock_verify_password)
+@mock.patch(
+    "fastapi_auth.services.password.verify_password_async",
+    mock_verify_password_async,
+)
 async def test_password_change():
     service = PasswordService(user)
     item = await service._repo.get(user.id)
@@ -0,0 +1,50 @@
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from fastapi_auth.repositories import UsersRepo
+from fastapi_auth.services import SearchService
+
+from .utils import MockCacheBackend, MockDatabaseBackend
+
+
+@pytest.fixture(autouse=True)
+def search_service_setup():
+    database = MockDatabaseBackend("test")
+    now = datetime.utcnow()
+    database._users = [
+        {
+            "id": i,
+            "email": f"user{i}@gmail.com",
+            "username": f"user{i}",
+            "active": True,
+            "confirmed": True,
+            "created_at": now,
+            "last_login": now,
+        }
+        for i in range(1, 31)
+    ]
+    SearchService.setup(UsersRepo(database, MockCacheBackend(), []))
+
+
+@pytest.mark.asyncio
+async def test_search_cursor():
+    service = SearchService()
+
+    first = await service.search(None, None, 1, "")
+    assert [item["id"] for item in first["items"]] == list(range(1, 21))
+    assert first["total"] == 30
+    assert first["next"] is not None
+
+    second = await service.search(None, None, 1, first["next"], "none")
+    assert [item["id"] for item in second["items"]] == list(range(21, 31))
+    assert second["next"] is None
+    assert second["total"] is None
+
+
+@pytest.mark.asyncio
+async def test_search_invalid_cursor():
+    with pytest.raises(HTTPException) as e:
+        await SearchService().search(None, None, 1, "not a cursor")
+    assert e.value.status_code == 400
@@ -0,0 +1,69 @@
+from datetime import datetime
+
+import pytest
+from passlib.hash import bcrypt, django_pbkdf2_sha256
+
+from fastapi_auth.repositories import UsersRepo
+from fastapi_auth.services import ImportService
+
+from .utils import MockCacheBackend, MockDatabaseBackend
+
+bcrypt_hash = bcrypt.using(rounds=4).hash("12345678")
+django_hash = django_pbkdf2_sha256.using(rounds=1000).hash("12345678")
+
+
+@pytest.fixture(autouse=True)
+def import_service_setup():
+    ImportService.setup(UsersRepo(MockDatabaseBackend("test"), MockCacheBackend(), []))
+
+
+async def records(items):
+    for item in items:
+        yield item
+
+
+@pytest.mark.asyncio
+async def test_import_users():
+    reports = []
+    items = [
+        {
+            "email": "legacy1@gmail.com",
+            "username": "legacy1",
+            "password": django_hash,
+            "created_at": "2015-03-01T10:00:00",
+        },
+        {"email": "legacy2@gmail.com", "username": "legacy2", "password": "plain"},
+        {"email": "legacy3@gmail.com", "username": "legacy3", "password": bcrypt_hash},
+        {"email": "user@gmail.com", "username": "dup", "password": bcrypt_hash},
+        {"email": "wrong", "username": "legacy5", "password": bcrypt_hash},
+        {
+            "email": "legacy6@gmail.com",
+            "username": "legacy6",
+            "provider": "google",
+            "sid": "42",
+            "created_at": datetime(2016, 1, 1),
+            "last_login": datetime(2019, 1, 1),
+        },
+    ]
+
+    service = ImportService()
+    report = await service.import_users(records(items), 2, reports.append)
+
+    assert report["processed"] == 6
+    assert report["inserted"] == 3
+    assert sorted(error["row"] for error in report["errors"]) == [1, 3, 4]
+    assert len(reports) == 2
+
+    db = service._repo._database
+    legacy1 = db._get("username", "legacy1")
+    assert legacy1["password"] == django_hash
+    assert legacy1["created_at"] == datetime(2015, 3, 1, 10)
+    assert legacy1["last_login"] == datetime(2015, 3, 1, 10)
+    assert db._get("username", "legacy3")["password"] == bcrypt_hash
+
+    legacy6 = db._get("username", "legacy6")
+    assert legacy6["confirmed"] and "password" not in legacy6
+    assert legacy6["last_login"] == datetime(2019, 1, 1)
+    assert (
+        len({legacy1["id"], legacy6["id"], db._get("username", "legacy3")["id"]}) == 3
+    )
@@ -1,7 +1,15 @@
+import asyncio
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-from typing import Iterable, Optional, Tuple, Union
+from fnmatch import fnmatch
+from typing import Any, AsyncIterator, Iterable, List, Optional, Tuple, Union
 
 import jwt
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+
+from fastapi_auth.db.backend import RedisScript
 
 with open("tests/private_key", "rb") as f:
     private_key = f.read()
@@ -9,6 +17,25 @@ with open("tests/private_key", "rb") as f:
 with open("tests/public_key", "rb") as f:
     public_key = f.read()
 
+
+def generate_keys(algorithm: str) -> Tuple[bytes, bytes]:
+    if algorithm == "ES256":
+        key = ec.generate_private_key(ec.SECP256R1(), default_backend())
+    elif algorithm == "EdDSA":
+        key = ed25519.Ed25519PrivateKey.generate()
+    else:
+        key = rsa.generate_private_key(65537, 2048, default_backend())
+    private_pem = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    public_pem = key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return private_pem, public_pem
+
+
 ACCESS_COOKIE_NAME = "access"
 REFRESH_COOKIE_NAME = "refresh"
 
@@ -89,6 +116,9 @@ class MockDatabaseBackend:
         self._incr += 1
         return self._incr
 
+    async def allocate_ids(self, count: int = 1) -> List[int]:
+        return [self._increment_id() for _ in range(count)]
+
     def _get(self, field: str, value) -> Optional[dict]:
         for item in self._users:
             if item.get(field) == value:
@@ -96,14 +126,22 @@ class MockDatabaseBackend:
 
         return None
 
-    async def get(self, id: int) -> Optional[dict]:
-        return self._get("id", id)
+    @staticmethod
+    def _project(item: Optional[dict], fields: Optional[Iterable[str]]):
+        if item is None or fields is None:
+            return item
+        return {field: item[field] for field in fields if field in item}
 
-    async def get_by_email(self, email: str) -> Optional[dict]:
-        return self._get("email", email)
+    async def get(self, id: int, fields: Optional[Iterable[str]] = None):
+        return self._project(self._get("id", id), fields)
 
-    async def get_by_username(self, username: str) -> Optional[dict]:
-        return self._get("username", username)
+    async def get_by_email(self, email: str, fields: Optional[Iterable[str]] = None):
+        return self._project(self._get("email", email), fields)
+
+    async def get_by_username(
+        self, username: str, fields: Optional[Iterable[str]] = None
+    ):
+        return self._project(self._get("username", username), fields)
 
     async def get_by_social(self, provider: str, sid: str) -> Optional[dict]:
         for item in self._users:
@@ -118,6 +156,17 @@ class MockDatabaseBackend:
         self._users.append(obj)
         return id
 
+    async def insert_many(self, objs: List[dict]) -> List[Tuple[int, str]]:
+        errors = []
+        for i, obj in enumerate(objs):
+            if self._get("email", obj.get("email")) or self._get(
+                "username", obj.get("username")
+            ):
+                errors.append((i, "E11000 duplicate key error"))
+            else:
+                self._users.append(obj)
+        return errors
+
     async def update(self, id: int, obj: dict) -> bool:
         for i, item in enumerate(self._users):
             if item.get("id") == id:
@@ -144,50 +193,147 @@ class MockDatabaseBackend:
                 return None
         self._email_confirmations.append({"email": email, "token": token_hash})
 
-    async def confirm_email(self, token_hash: str) -> bool:
+    async def confirm_email(self, token_hash: str) -> Optional[int]:
         for i, item in enumerate(self._email_confirmations):
             if item.get("token") == token_hash:
                 user = self._get("email", item.get("email"))
                 await self.update(user.get("id"), {"confirmed": True})
-                return True
-        return False
+                return user.get("id")
+        return None
 
-    async def get_blacklist(self) -> Iterable[dict]:
-        return [item for item in self._users if not item.get("active")]
+    async def get_blacklist(self, after: Optional[int], size: int) -> List[dict]:
+        items = [
+            item
+            for item in sorted(self._users, key=lambda item: item.get("id"))
+            if not item.get("active") and (after is None or item.get("id") > after)
+        ]
+        limit = size + 1
+        return items[:limit]
 
-    async def search(self) -> Tuple[dict, int]:
+    async def search(
+        self, f: dict, p: int, size: int, total: str = "exact"
+    ) -> Tuple[List[dict], Optional[int]]:
         return self._users, 1
 
+    async def search_after(
+        self, f: dict, after: Optional[int], size: int, total: str = "exact"
+    ) -> Tuple[List[dict], Optional[int]]:
+        items = sorted(
+            (item for item in self._users if after is None or item["id"] > after),
+            key=lambda item: item["id"],
+        )
+        return items[: size + 1], len(self._users) if total != "none" else None
+
+
+class MockPipeline:
+    def __init__(self, cache: "MockCacheBackend") -> None:
+        self._cache = cache
+        self._commands = []
+
+    def __getattr__(self, name: str):
+        def queue(*args, **kwargs) -> asyncio.Future:
+            future = asyncio.get_event_loop().create_future()
+            self._commands.append((future, getattr(self._cache, name), args, kwargs))
+            return future
+
+        return queue
+
+    async def execute(self) -> None:
+        for future, command, args, kwargs in self._commands:
+            future.set_result(await command(*args, **kwargs))
+
 
 class MockCacheBackend:
+    supports_pubsub = True
+
     def __init__(self) -> None:
         self._db = {}
 
     async def get(self, key: str) -> Optional[str]:
         return self._db.get(key)
 
+    async def mget(self, key: str, *keys: str) -> List[Optional[str]]:
+        return [self._db.get(k) for k in (key, *keys)]
+
     async def delete(self, key: str) -> None:
         try:
             self._db.pop(key)
         except KeyError:
             pass
 
-    async def keys(self, match: str) -> Iterable[str]:
-        return {}  # TODO
+    async def scan(self, match: str, count: int = 1000) -> AsyncIterator[str]:
+        for key in [key for key in self._db if fnmatch(key, match)]:
+            yield key
+
+    async def set(
+        self, key: str, value: Union[str, bytes, int], expire: Optional[int] = None
+    ) -> None:
+        self._db[key] = value
 
-    async def set(self, key: str, value: Union[str, bytes, int], expire: int) -> None:
+    async def setnx(
+        self, key: str, value: Union[str, bytes, int], expire: Optional[int] = None
+    ) -> bool:
+        if key in self._db:
+            return False
         self._db[key] = value
+        return True
 
-    async def setnx(self, key: str, value: Union[str, bytes, int], expire: int) -> None:
-        v = self._db.get(key)
-        if v is None:
-            self._db[key] = value
+    async def getset(
+        self, key: str, value: Union[str, bytes, int], expire: Optional[int] = None
+    ) -> Optional[str]:
+        previous = self._db.get(key)
+        self._db[key] = value
+        return previous
+
+    @asynccontextmanager
+    async def pipeline(self, transaction: bool = True):
+        pipe = MockPipeline(self)
+        yield pipe
+        await pipe.execute()
+
+    async def pttl(self, key: str) -> int:
+        return -1 if key in self._db else -2
 
     async def incr(self, key: str) -> str:
         v = self._db.get(key)
         if v is not None:
             self._db[key] = int(v) + 1
 
+    async def zadd(self, key: str, score: float, member: Union[str, int]) -> None:
+        self._db.setdefault(key, {})[str(member)] = score
+
+    async def zrem(self, key: str, member: Union[str, int]) -> None:
+        self._db.get(key, {}).pop(str(member), None)
+
+    async def zrangebyscore_withscores(
+        self, key: str, min: float = float("-inf"), max: float = float("inf")
+    ) -> List[Tuple[str, float]]:
+        items = sorted(
+            (score, member)
+            for member, score in self._db.get(key, {}).items()
+            if min <= score <= max
+        )
+        return [(member, score) for score, member in items]
+
+    async def zrangebyscore(
+        self, key: str, min: float = float("-inf"), max: float = float("inf")
+    ) -> List[str]:
+        return [
+            member for member, _ in await self.zrangebyscore_withscores(key, min, max)
+        ]
+
+    async def zremrangebyscore(self, key: str, min: float, max: float) -> None:
+        zset = self._db.get(key, {})
+        for member, score in list(zset.items()):
+            if min <= score <= max:
+                del zset[member]
+
+    async def run_script(
+        self, script: RedisScript, keys: List[str], args: List[Any]
+    ) -> Any:
+        # scripts are tested on a real server, see the redis_cache fixture
+        raise NotImplementedError("Lua scripts need the redis_cache fixture")
+
     async def dispatch_action(self, channel: str, action: str, payload: str) -> None:
         print("Dispatching action")
         print(action)
@@ -269,5 +415,9 @@ def mock_verify_password(password: str, db_password: str) -> bool:
     return password == db_password
 
 
+async def mock_verify_password_async(password: str, db_password: str) -> bool:
+    return mock_verify_password(password, db_password)
+
+
 def mock_admin_required():
     pass